@@ -0,0 +1,315 @@
+"""
+End-to-end load driver for the KigoAuto API.
+
+Starts the mock storefront in-process (unless ``--storefront`` points at one)
+and the API under uvicorn (unless ``--api`` points at one), then runs
+``--users`` concurrent virtual users. Each runs ``--iterations`` of
+login -> add products -> cart status -> close browser. Reports throughput,
+latency percentiles and failure rate per endpoint, plus the RSS of the
+Chrome/ChromeDriver processes while the run lasts:
+
+    python benchmarks/load_driver.py --users 4 --iterations 3 --json run.json
+    python benchmarks/load_driver.py --baseline run.json --threshold 0.2
+
+With ``--baseline`` the exit status is 1 when an endpoint's p95 or failure rate
+regressed by more than ``--threshold`` against the saved report.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mock_storefront import PRODUCTS, add_storefront_arguments, make_server, storefront_options
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from kigoauto_metrics import Histogram  # noqa: E402
+
+CHROME_PROCESS_NAMES = ("chrome", "chromium", "chromedriver")
+
+
+def latency_quantiles(latencies):
+    """p50/p95/p99 of every latency, with the nearest-rank math the API's /metrics uses"""
+    histogram = Histogram(window=len(latencies))
+    for seconds in latencies:
+        histogram.observe(seconds)
+    return histogram.quantiles()
+
+
+def chrome_rss():
+    """(total RSS in bytes, process count) of Chrome and ChromeDriver processes, read from /proc"""
+    total = 0
+    count = 0
+    if not os.path.isdir("/proc"):
+        return 0, 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/comm") as f:
+                name = f.read().strip().lower()
+            if not any(chrome in name for chrome in CHROME_PROCESS_NAMES):
+                continue
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        count += 1
+                        break
+        except (OSError, ValueError):
+            continue
+    return total, count
+
+
+class ChromeMonitor(threading.Thread):
+    """Samples Chrome RSS every ``interval`` seconds until stopped"""
+
+    def __init__(self, interval=0.5):
+        super().__init__(name="chrome-monitor", daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append(chrome_rss())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def report(self):
+        rss = [total for total, _ in self.samples]
+        processes = [count for _, count in self.samples]
+        mib = 1024 * 1024
+        return {
+            "samples": len(rss),
+            "peak_rss_mib": round(max(rss) / mib, 1) if rss else None,
+            "mean_rss_mib": round(sum(rss) / len(rss) / mib, 1) if rss else None,
+            "peak_processes": max(processes) if processes else None,
+        }
+
+
+class Recorder:
+    """Latency and outcome of every API call, grouped by endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.errors = {}
+
+    def record(self, endpoint, seconds, ok, error=None):
+        with self._lock:
+            self.calls.setdefault(endpoint, []).append((seconds, ok))
+            if error:
+                errors = self.errors.setdefault(endpoint, {})
+                errors[error] = errors.get(error, 0) + 1
+
+    def report(self, wall_seconds):
+        with self._lock:
+            endpoints = {}
+            total = succeeded = 0
+            for endpoint, calls in sorted(self.calls.items()):
+                latencies = [seconds for seconds, _ in calls]
+                ok = sum(1 for _, success in calls if success)
+                quantiles = latency_quantiles(latencies)
+                total += len(calls)
+                succeeded += ok
+                endpoints[endpoint] = {
+                    "calls": len(calls),
+                    "failures": len(calls) - ok,
+                    "failure_rate": round((len(calls) - ok) / len(calls), 4),
+                    "throughput_rps": round(ok / wall_seconds, 3) if wall_seconds else None,
+                    "mean": round(sum(latencies) / len(latencies), 4),
+                    "p50": round(quantiles[0.5], 4),
+                    "p95": round(quantiles[0.95], 4),
+                    "p99": round(quantiles[0.99], 4),
+                    "max": round(max(latencies), 4),
+                    "errors": dict(sorted(self.errors.get(endpoint, {}).items(), key=lambda e: -e[1])[:5]),
+                }
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "calls": total,
+            "failures": total - succeeded,
+            "failure_rate": round((total - succeeded) / total, 4) if total else None,
+            "throughput_rps": round(succeeded / wall_seconds, 3) if wall_seconds else None,
+            "endpoints": endpoints,
+        }
+
+
+def call(session, recorder, api, method, path, endpoint=None, **kwargs):
+    """Call the API, record latency and outcome, and return the JSON body (None on failure)"""
+    endpoint = endpoint or path
+    start = time.time()
+    try:
+        response = session.request(method, api + path, timeout=300, **kwargs)
+        body = response.json()
+    except Exception as e:
+        recorder.record(endpoint, time.time() - start, False, type(e).__name__)
+        return None
+    seconds = time.time() - start
+    ok = response.status_code == 200 and body.get("status") == "success"
+    recorder.record(endpoint, seconds, ok, None if ok else f"{response.status_code} {body.get('message', '')}"[:120])
+    return body
+
+
+def run_user(index, args, recorder, api, storefront):
+    """One virtual user: ``args.iterations`` rounds of login, add to cart, cart status, close"""
+    session = requests.Session()
+    slugs = itertools.cycle(PRODUCTS)
+    for iteration in range(args.iterations):
+        # Reusing the account lets later logins take the cached-cookie path
+        suffix = f"-{iteration}" if args.fresh_logins else ""
+        email = f"bench{index}{suffix}@example.test"
+        login = call(session, recorder, api, "POST", "/login", json={"email": email, "password": args.password})
+        if not login or login.get("status") != "success":
+            continue
+        session_id = login["session_id"]
+        items = [{"url": f"{storefront}/products/{next(slugs)}", "quantity": 1} for _ in range(args.products)]
+        if args.batch:
+            call(session, recorder, api, "POST", "/add-products",
+                 json={"items": items, "session_id": session_id})
+        else:
+            for item in items:
+                call(session, recorder, api, "POST", "/add-product", json=dict(item, session_id=session_id))
+        call(session, recorder, api, "GET", "/cart-status", params={"session_id": session_id})
+        call(session, recorder, api, "POST", "/close-browser", params={"session_id": session_id})
+
+
+def start_api(args, storefront, workdir):
+    """Run the API under uvicorn pointed at the storefront; returns the process"""
+    env = dict(os.environ)
+    env.setdefault("KIGOAUTO_HUMANIZE", args.humanize)
+    env["KIGOAUTO_BASE_URL"] = storefront
+    env["KIGOAUTO_SESSION_STORE"] = os.path.join(workdir, "sessions.db")
+    env["KIGOAUTO_SELECTOR_CACHE"] = os.path.join(workdir, "selectors.json")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main_kigoauto:app", "--host", "127.0.0.1", "--port", str(args.api_port)],
+        cwd=REPO_ROOT, env=env,
+    )
+    api = f"http://127.0.0.1:{args.api_port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited with status {process.returncode}")
+        try:
+            requests.get(api + "/", timeout=2)
+            return process, api
+        except requests.ConnectionError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("API did not start within 60s")
+
+
+def compare(report, baseline, threshold):
+    """Endpoints whose p95 or failure rate got worse than the baseline by more than ``threshold``"""
+    regressions = []
+    for endpoint, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        if previous["p95"] and current["p95"] > previous["p95"] * (1 + threshold):
+            regressions.append(f"{endpoint}: p95 {previous['p95']}s -> {current['p95']}s")
+        if current["failure_rate"] > previous["failure_rate"] + threshold:
+            regressions.append(f"{endpoint}: failure rate {previous['failure_rate']} -> {current['failure_rate']}")
+    return regressions
+
+
+def print_report(report):
+    print(f"\n{report['calls']} calls in {report['wall_seconds']}s, "
+          f"{report['throughput_rps']} successful calls/s, failure rate {report['failure_rate']}")
+    print(f"{'endpoint':<16} {'calls':>6} {'fail':>5} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<16} {stats['calls']:>6} {stats['failures']:>5} {stats['throughput_rps']:>7} "
+              f"{stats['p50']:>8} {stats['p95']:>8} {stats['p99']:>8} {stats['max']:>8}")
+        for error, count in stats["errors"].items():
+            print(f"    {count} x {error}")
+    chrome = report["chrome"]
+    print(f"Chrome RSS: peak {chrome['peak_rss_mib']} MiB, mean {chrome['mean_rss_mib']} MiB, "
+          f"peak {chrome['peak_processes']} processes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the KigoAuto API against the mock storefront")
+    parser.add_argument("--api", help="URL of a running API; otherwise one is started with uvicorn")
+    parser.add_argument("--api-port", type=int, default=8765, help="port for the API started by this script")
+    parser.add_argument("--storefront", help="URL of a running storefront; otherwise one is started in-process")
+    parser.add_argument("--users", type=int, default=2, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=3, help="login/add/close rounds per user")
+    parser.add_argument("--products", type=int, default=2, help="products added per round")
+    parser.add_argument("--batch", action="store_true", help="add each round's products with /add-products")
+    parser.add_argument("--fresh-logins", action="store_true", help="use a new account every round (no cached logins)")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--humanize", default="fast", help="KIGOAUTO_HUMANIZE for the API started by this script")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95 regression")
+    add_storefront_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    storefront = args.storefront
+    if not storefront:
+        server = make_server("127.0.0.1", 0, **storefront_options(args))
+        threading.Thread(target=server.serve_forever, name="storefront", daemon=True).start()
+        storefront = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"Mock storefront ({args.layout} layout) at {storefront}")
+
+    process = None
+    # Session store and selector cache of the API started here; removed with the run
+    workdir = tempfile.TemporaryDirectory(prefix="kigoauto_bench_")
+    api = args.api
+    monitor = ChromeMonitor()
+    try:
+        if not api:
+            process, api = start_api(args, storefront, workdir.name)
+            print(f"API at {api}")
+        api = api.rstrip("/")
+        recorder = Recorder()
+        monitor.start()
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            list(pool.map(lambda index: run_user(index, args, recorder, api, storefront), range(args.users)))
+        report = recorder.report(time.time() - start)
+    finally:
+        if monitor.is_alive():
+            monitor.stop()
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if server is not None:
+            server.shutdown()
+        workdir.cleanup()
+
+    report["chrome"] = monitor.report()
+    report["config"] = {key: value for key, value in vars(args).items() if key not in ("password", "baseline", "json")}
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Local mock of the Kigoauto storefront.
+
+Serves the pages the automation touches (landing, login, product and cart) with
+the same form fields and selectors as the live site, so the browser and HTTP
+cart paths can be exercised offline:
+
+    python benchmarks/mock_storefront.py --port 8800
+    KIGOAUTO_BASE_URL=http://127.0.0.1:8800 uvicorn main_kigoauto:app
+
+Accounts are accepted with any email and a password of at least 6 characters.
+With ``--challenge`` every non-browser client gets a Cloudflare-style
+interstitial, which exercises the HTTP fast path's fallback to Selenium.
+
+``--latency``/``--jitter`` (and ``--page-latency kind=ms``) slow responses down,
+``--error-rate`` answers a fraction of requests with a 500, and ``--layout``
+switches the markup:
+
+- ``classic``: the live site's selectors (the first candidate of every lookup)
+- ``alt``: renamed ids, classes and fields that only the fallback selectors match
+- ``spa``: the classic forms, rendered by JavaScript ``--render-delay`` ms after load
+"""
+import argparse
+import html
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PRODUCTS = {
+    "brake-pad-set": ("KG-1001", "Ceramic Brake Pad Set", 49.99),
+    "oil-filter": ("KG-2002", "Premium Oil Filter", 8.49),
+    "wiper-blades": ("KG-3003", "All Season Wiper Blades", 19.95),
+}
+
+LAYOUTS = ("classic", "alt", "spa")
+
+# Page kinds accepted by --page-latency
+PAGE_KINDS = ("landing", "login", "login_submit", "account", "product", "cart_add", "cart")
+
+LOGIN_PATHS = ("/account/login", "/login", "/customer/account/login")
+
+CHALLENGE_PAGE = """<!DOCTYPE html><html><head><title>Just a moment...</title></head>
+<body><div id="challenge-platform" class="cf-chl">Checking your browser before accessing the site.</div></body></html>"""
+
+
+class Storefront:
+    """In-memory accounts, sessions and carts shared by all request handlers"""
+
+    def __init__(self, challenge=False, layout="classic", latency=0.0, jitter=0.0, page_latency=None,
+                 error_rate=0.0, render_delay=0.5):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{layout}', expected one of {LAYOUTS}")
+        self.challenge = challenge
+        self.layout = layout
+        self.latency = latency
+        self.jitter = jitter
+        self.page_latency = dict(page_latency or {})
+        self.error_rate = error_rate
+        self.render_delay = render_delay
+        self.lock = threading.Lock()
+        self.sessions = {}  # session token -> email
+        self.carts = {}  # cart token -> {sku: qty}
+        self.order_ids = itertools.count(1)
+
+    def login(self, email, password):
+        if not email or len(password) < 6:
+            return None
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[token] = email
+        return token
+
+    def account_for(self, token):
+        with self.lock:
+            return self.sessions.get(token)
+
+    def add_to_cart(self, cart_token, sku, quantity):
+        with self.lock:
+            cart = self.carts.setdefault(cart_token, {})
+            cart[sku] = cart.get(sku, 0) + quantity
+            return sum(cart.values())
+
+    def cart(self, cart_token):
+        with self.lock:
+            return dict(self.carts.get(cart_token, {}))
+
+    def delay_for(self, kind):
+        """Seconds to hold a response of this page kind"""
+        delay = self.page_latency.get(kind, self.latency)
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+
+def login_form(layout):
+    if layout == "alt":
+        return """
+<form method="post" action="/customer/account/login" class="customer-login">
+  <input type="email" name="email" class="form-control" placeholder="Email address">
+  <input type="password" name="password" class="form-control" placeholder="Password">
+  <button type="submit" class="btn btn-primary">Log in</button>
+</form>"""
+    return """
+<form method="post" action="/account/login" class="login-form">
+  <input type="text" name="Email" class="input_box_txt" placeholder="you@domain.com">
+  <input type="password" name="Password" class="input_box_txt" placeholder="at least 6 characters">
+  <button type="submit" class="signbtn signin">Sign In</button>
+</form>"""
+
+
+def product_form(layout, sku):
+    if layout == "alt":
+        return f"""
+<form method="post" action="/cart/add" class="product-form">
+  <input type="hidden" name="ProId" value="{sku}">
+  <input type="number" id="qty" class="qty_num" name="Qty" value="1" min="1">
+  <button type="submit" class="button trans3">ADD TO CART</button>
+</form>"""
+    return f"""
+<form method="post" action="/cart/add" id="goods_form">
+  <input type="hidden" name="ProId" value="{sku}">
+  <input type="text" id="quantity" class="qty_num" name="Qty" value="1">
+  <button type="submit" id="addtocart_button" class="button trans3">ADD TO CART</button>
+</form>"""
+
+
+def client_rendered(markup, delay):
+    """Markup inserted by a script ``delay`` seconds after load, like a single-page app"""
+    return f"""<div id="app" class="loading"></div>
+<script>setTimeout(function () {{
+  var app = document.getElementById('app');
+  app.innerHTML = {json.dumps(markup)};
+  app.className = '';
+}}, {int(delay * 1000)});</script>"""
+
+
+def page(title, body, logged_in=False, layout="classic"):
+    if logged_in:
+        account_links = '<a href="/account">My Account</a> <a href="/account/logout">Log Out</a>'
+    elif layout == "alt":
+        account_links = '<a href="/customer/account/login" class="header-account">Account</a>'
+    else:
+        account_links = '<a href="/account/login" class="sign-in-link">Sign In</a>'
+    return f"""<!DOCTYPE html>
+<html><head><title>{html.escape(title)} - Kigoauto</title></head>
+<body>
+<header><a href="/">Kigoauto</a> {account_links} <a href="/cart">Cart</a></header>
+<main>{body}</main>
+</body></html>"""
+
+
+class StorefrontHandler(BaseHTTPRequestHandler):
+    store = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # Helpers
+
+    def cookies(self):
+        jar = SimpleCookie(self.headers.get("Cookie", ""))
+        return {name: morsel.value for name, morsel in jar.items()}
+
+    def account(self):
+        return self.store.account_for(self.cookies().get("session_id"))
+
+    def form(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        data = self.rfile.read(length).decode() if length else ""
+        return {key: values[-1] for key, values in parse_qs(data).items()}
+
+    def page(self, title, body, logged_in=False):
+        return page(title, body, logged_in, self.store.layout)
+
+    def form_markup(self, markup):
+        if self.store.layout == "spa":
+            return client_rendered(markup, self.store.render_delay)
+        return markup
+
+    def simulate(self, kind):
+        """Apply the configured latency for this page kind; returns True if an error was injected"""
+        delay = self.store.delay_for(kind)
+        if delay > 0:
+            time.sleep(delay)
+        if self.store.error_rate and random.random() < self.store.error_rate:
+            self.send_html(self.page("Server Error", "<h1>Internal Server Error</h1>"), status=500)
+            return True
+        return False
+
+    def send_html(self, body, status=200, set_cookies=()):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for cookie in set_cookies:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def redirect(self, location, set_cookies=()):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        for cookie in set_cookies:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+
+    def challenged(self):
+        user_agent = self.headers.get("User-Agent", "")
+        # Headless/real Chrome sends Sec-Ch-Ua; plain HTTP clients do not
+        if self.store.challenge and "sec-ch-ua" not in {k.lower() for k in self.headers.keys()}:
+            self.send_response(503)
+            payload = CHALLENGE_PAGE.encode()
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("Server", "cloudflare")
+            self.send_header("CF-RAY", "mock-" + user_agent[:8])
+            self.end_headers()
+            self.wfile.write(payload)
+            return True
+        return False
+
+    # Routes
+
+    def do_GET(self):
+        if self.challenged():
+            return
+        path = urlparse(self.path).path.rstrip("/") or "/"
+        account = self.account()
+        if path == "/":
+            if self.simulate("landing"):
+                return
+            items = "".join(
+                f'<li><a href="/products/{slug}">{html.escape(name)}</a></li>'
+                for slug, (_, name, _) in PRODUCTS.items()
+            )
+            self.send_html(self.page("Home", f"<h1>Kigoauto</h1><ul>{items}</ul>", account is not None))
+        elif path in LOGIN_PATHS:
+            if self.simulate("login"):
+                return
+            self.send_html(self.page("Sign In", self.form_markup(login_form(self.store.layout))))
+        elif path == "/account":
+            if self.simulate("account"):
+                return
+            if account is None:
+                self.redirect("/account/login")
+            else:
+                self.send_html(self.page("My Account", f"<h1>Welcome {html.escape(account)}</h1>", True))
+        elif path == "/account/logout":
+            self.redirect("/", set_cookies=["session_id=; Path=/; Max-Age=0"])
+        elif path.startswith("/products/"):
+            if self.simulate("product"):
+                return
+            slug = path.split("/", 2)[2]
+            if slug not in PRODUCTS:
+                self.send_html(self.page("Not Found", "<h1>Product not found</h1>"), status=404)
+                return
+            sku, name, price = PRODUCTS[slug]
+            self.send_html(self.page(name, f"""
+<h1 class="product-title">{html.escape(name)}</h1>
+<span class="price">${price:.2f}</span>
+{self.form_markup(product_form(self.store.layout, sku))}""", account is not None))
+        elif path == "/cart":
+            if self.simulate("cart"):
+                return
+            self.send_cart(account)
+        else:
+            self.send_html(self.page("Not Found", "<h1>Not found</h1>"), status=404)
+
+    def do_POST(self):
+        if self.challenged():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        form = self.form()
+        if path in LOGIN_PATHS:
+            if self.simulate("login_submit"):
+                return
+            # The alt layout posts lowercase field names
+            email = form.get("Email", form.get("email", ""))
+            password = form.get("Password", form.get("password", ""))
+            token = self.store.login(email, password)
+            if token is None:
+                self.send_html(self.page("Sign In", "<p class='error'>Invalid email or password</p>"), status=401)
+            else:
+                self.redirect("/account", set_cookies=[f"session_id={token}; Path=/; Max-Age=86400; HttpOnly"])
+        elif path == "/cart/add":
+            if self.simulate("cart_add"):
+                return
+            if self.account() is None:
+                self.redirect("/account/login")
+                return
+            cart_token = self.cookies().get("cart_token") or uuid.uuid4().hex
+            try:
+                quantity = max(1, int(form.get("Qty", "1")))
+            except ValueError:
+                quantity = 1
+            self.store.add_to_cart(cart_token, form.get("ProId", ""), quantity)
+            self.redirect("/cart", set_cookies=[f"cart_token={cart_token}; Path=/; Max-Age=604800"])
+        else:
+            self.send_html(self.page("Not Found", "<h1>Not found</h1>"), status=404)
+
+    def send_cart(self, account):
+        cart = self.store.cart(self.cookies().get("cart_token"))
+        by_sku = {sku: (name, price) for sku, name, price in PRODUCTS.values()}
+        rows = []
+        total = 0.0
+        for sku, qty in cart.items():
+            name, price = by_sku.get(sku, (sku, 0.0))
+            total += qty * price
+            rows.append(
+                f'<tr class="cart-item" data-sku="{sku}"><td class="sku">{sku}</td>'
+                f'<td class="name">{html.escape(name)}</td><td class="qty">{qty}</td>'
+                f'<td class="price">${price:.2f}</td><td class="line-total">${qty * price:.2f}</td></tr>'
+            )
+        body = f"""
+<h1>Shopping Cart</h1>
+<span class="cart-count">{sum(cart.values())}</span>
+<table class="cart-table">{''.join(rows)}</table>
+<div class="cart-total">${total:.2f}</div>"""
+        self.send_html(self.page("Cart", body, account is not None))
+
+
+def make_server(host="127.0.0.1", port=0, challenge=False, **options):
+    """
+    Create a storefront server; ``port=0`` picks a free port (see ``server.server_address``).
+    ``options`` are passed to Storefront (layout, latency, jitter, page_latency, ...).
+    """
+    handler = type("Handler", (StorefrontHandler,), {"store": Storefront(challenge=challenge, **options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_page_latency(values):
+    """Turn ["login=800", "cart=200"] (milliseconds) into {"login": 0.8, "cart": 0.2}"""
+    latency = {}
+    for value in values or []:
+        kind, _, ms = value.partition("=")
+        if kind not in PAGE_KINDS or not ms:
+            raise argparse.ArgumentTypeError(f"Expected kind=ms with kind in {PAGE_KINDS}, got '{value}'")
+        latency[kind] = float(ms) / 1000
+    return latency
+
+
+def add_storefront_arguments(parser):
+    """Storefront options shared by this script and the load driver"""
+    parser.add_argument("--challenge", action="store_true",
+                        help="answer non-browser clients with a Cloudflare-style challenge")
+    parser.add_argument("--layout", choices=LAYOUTS, default="classic", help="page markup variant")
+    parser.add_argument("--latency", type=float, default=0.0, help="added to every response, in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency up to this many ms")
+    parser.add_argument("--page-latency", action="append", metavar="KIND=MS",
+                        help=f"latency for one page kind ({', '.join(PAGE_KINDS)}); repeatable")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--render-delay", type=float, default=500, help="ms before the spa layout renders its forms")
+
+
+def storefront_options(args):
+    return {
+        "challenge": args.challenge,
+        "layout": args.layout,
+        "latency": args.latency / 1000,
+        "jitter": args.jitter / 1000,
+        "page_latency": parse_page_latency(args.page_latency),
+        "error_rate": args.error_rate,
+        "render_delay": args.render_delay / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock Kigoauto storefront")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    add_storefront_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, **storefront_options(args))
+    host, port = server.server_address[:2]
+    print(f"Mock storefront ({args.layout} layout) running at http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
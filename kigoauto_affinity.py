@@ -0,0 +1,186 @@
+import asyncio
+import json
+import socket
+import threading
+from urllib.parse import parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Set on forwarded requests, so the owner handles them instead of forwarding again
+FORWARDED_HEADER = "x-kigoauto-forwarded"
+# Tells the client which worker answered a forwarded request
+WORKER_HEADER = "x-kigoauto-worker"
+
+# Hop-by-hop headers, and headers that no longer match once requests has decoded the body
+SKIPPED_HEADERS = {"host", "connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding"}
+
+# (connect, read) timeouts for a forwarded request; a login may take minutes
+FORWARD_TIMEOUT = (5, 600)
+
+
+def query_param(scope, name):
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name)
+    return values[0] if values else None
+
+
+def json_field(body, name):
+    """``name`` from a JSON object body, or None for any other body"""
+    if not body:
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data.get(name) if isinstance(data, dict) else None
+
+
+class WorkerRouter:
+    """
+    ASGI middleware sending each request to the worker process that owns its state.
+
+    ``locate(scope, body)`` returns None to handle a request here, or the
+    (worker_id, address) of the worker it belongs to; the request is then
+    replayed there over HTTP and the answer (streamed, so server-sent events
+    keep working) is passed back. Requests that were already forwarded are
+    always handled locally. If the owner cannot be reached the request is
+    handled here, which answers like any unknown session would.
+    """
+
+    def __init__(self, app, locate, worker_id, pool_size=10):
+        self.app = app
+        self.locate = locate
+        self.worker_id = worker_id
+        self.client = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.client.mount("http://", adapter)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _header(scope, FORWARDED_HEADER) is not None:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        replay = _replay(body, receive)
+        try:
+            target = self.locate(scope, body)
+        except Exception as e:
+            print(f"Warning: Could not look up the owning worker: {e}")
+            target = None
+        if target is None:
+            await self.app(scope, replay, send)
+            return
+
+        owner_id, address = target
+        try:
+            response = await asyncio.to_thread(self._open, scope, body, address)
+        except requests.RequestException as e:
+            print(f"Worker {owner_id} at {address} is unreachable ({e}), handling {scope['path']} here")
+            await self.app(scope, replay, send)
+            return
+        await self._relay(response, owner_id, send)
+
+    def _open(self, scope, body, address):
+        url = f"http://{address}{scope.get('root_path', '')}{scope['path']}"
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"] if name.decode("latin-1").lower() not in SKIPPED_HEADERS
+        }
+        headers[FORWARDED_HEADER] = self.worker_id
+        return self.client.request(scope["method"], url, headers=headers, data=body or None,
+                                   stream=True, timeout=FORWARD_TIMEOUT, allow_redirects=False)
+
+    async def _relay(self, response, owner_id, send):
+        headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS
+        ]
+        headers.append((WORKER_HEADER.encode(), owner_id.encode("latin-1")))
+        chunks = response.iter_content(chunk_size=None)
+        try:
+            await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            response.close()
+
+
+def _header(scope, name):
+    name = name.encode("latin-1")
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _replay(body, receive):
+    """A ``receive`` that hands the buffered body to the app, then defers to the real one"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+class InternalServer:
+    """
+    The app served on a second, per-worker port that other workers forward to.
+
+    Workers behind gunicorn share the public socket, so a request cannot pick its
+    worker there; each worker also listens on its own ``host:port`` (port 0 picks
+    a free one) from a background thread. The app's startup and shutdown hooks
+    are not run again for it.
+    """
+
+    def __init__(self, app, host="127.0.0.1", port=0, advertise_host=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.advertise_host = advertise_host or host
+        self.address = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        import uvicorn
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        # Listen right away so peers that connect before the server loop runs just wait
+        sock.listen(128)
+        self.address = f"{self.advertise_host}:{sock.getsockname()[1]}"
+        config = uvicorn.Config(self.app, lifespan="off", log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]},
+                                        name="internal-api", daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self, timeout=5):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=timeout)
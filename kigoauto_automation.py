@@ -1,26 +1,123 @@
 from selenium import webdriver
 from selenium.common import WebDriverException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
-from webdriver_manager.chrome import ChromeDriverManager
 import undetected_chromedriver as uc
 import time
 import json
 import os
 import tempfile
 import sys
-import random
+import threading
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from kigoauto_events import StepEvents
+from kigoauto_metrics import metrics
+from kigoauto_browser import (resolve_chromedriver, chromedriver_error, shared_profile_template,
+                              discard_profile_dir, process_tree_rss, ResourceBlocker)
+from kigoauto_http import CartHttpClient, ChallengeDetected
+from kigoauto_cart import parse_cart
+from kigoauto_humanize import HumanizationPolicy
+from kigoauto_fill import FieldFiller
+from kigoauto_verify import LoginVerifier, LOGIN_PATH_MARKERS
+from kigoauto_network import CartResponseWatcher, enable_network_log
+from kigoauto_selectors import SelectorResolver, SelectorCache
+from kigoauto_waits import LatencyBudget, page_ready, url_changed_from, any_of, network_idle
+
+# Storefront root; override to point the automation at a mirror or a local mock storefront
+BASE_URL = os.environ.get("KIGOAUTO_BASE_URL", "http://kigoauto.com").rstrip("/")
+
+# How add_products() adds to cart: "browser", "http" (cookie replay only) or "auto"
+# (cookie replay, falling back to the browser when the site answers with a challenge)
+CART_MODE = os.environ.get("KIGOAUTO_CART_MODE", "auto")
+
+# Remembers which selector matched for each lookup; an empty path keeps it in memory only
+SELECTOR_CACHE_PATH = os.environ.get("KIGOAUTO_SELECTOR_CACHE", "kigoauto_selectors.json")
+_selector_cache = None
+_selector_cache_lock = threading.Lock()
+
+def shared_selector_cache():
+    """Return the process-wide SelectorCache, creating it on first use"""
+    global _selector_cache
+    with _selector_cache_lock:
+        if _selector_cache is None:
+            _selector_cache = SelectorCache(SELECTOR_CACHE_PATH or None)
+        return _selector_cache
+
+# Operations ("login", "product", "cart") that load pages with images, fonts, media
+# and analytics/ad requests blocked
+BLOCK_RESOURCES = {op.strip() for op in os.environ.get("KIGOAUTO_BLOCK_RESOURCES", "product,cart").split(",") if op.strip()}
+
+# How each form field is filled: a default strategy plus field=strategy overrides
+# ("keys", "cdp", "js" or "human"; see kigoauto_fill)
+FILL = os.environ.get("KIGOAUTO_FILL", "keys,quantity=js")
+
+# Signals that prove a login worked, checked in this order ("cookie", "logout", "url";
+# see kigoauto_verify), and the names of the authentication cookies
+LOGIN_VERIFY = os.environ.get("KIGOAUTO_LOGIN_VERIFY", "cookie,logout,url")
+LOGIN_COOKIES = os.environ.get("KIGOAUTO_LOGIN_COOKIES", "")
+
+# Record DevTools network events so an add-to-cart is confirmed from the cart
+# request's own response (see kigoauto_network)
+NETWORK_CAPTURE = os.environ.get("KIGOAUTO_NETWORK_CAPTURE", "1") != "0"
+
+# Latency budgets (seconds) shared by all waits of one login / add-to-cart
+LOGIN_BUDGET = float(os.environ.get("KIGOAUTO_LOGIN_BUDGET", "90"))
+CART_BUDGET = float(os.environ.get("KIGOAUTO_CART_BUDGET", "45"))
+
+# Every KigoAutoLogin alive in this process, so cleanup can tell live profiles from leftovers
+_instances = weakref.WeakSet()
+
+def live_profile_dirs():
+    """Profile directories of the drivers this process currently has open"""
+    return {kigo.user_data_dir for kigo in list(_instances)
+            if kigo.driver is not None and getattr(kigo, "user_data_dir", None)}
 
 class KigoAutoLogin:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, base_url=None, cart_mode=None, humanize=None,
+                 login_budget=None, cart_budget=None, selector_cache=None, user_data_dir=None,
+                 profile_template=None, block_resources=None, fill=None, verifier=None,
+                 network_capture=None):
         self.headless = headless
+        self.network_capture = NETWORK_CAPTURE if network_capture is None else network_capture
+        self.block_resources = set(BLOCK_RESOURCES if block_resources is None else block_resources)
+        self.blocker = None
+        # A fixed user_data_dir is used as-is and kept on close; otherwise each launch
+        # gets its own profile, cloned from the profile template when one is configured
+        self.fixed_user_data_dir = user_data_dir
+        self.profile_template = None if user_data_dir else (profile_template or shared_profile_template())
+        self.selector_cache = selector_cache or shared_selector_cache()
+        self.policy = humanize if isinstance(humanize, HumanizationPolicy) else (
+            HumanizationPolicy.from_profile(humanize) if humanize else HumanizationPolicy.from_env())
+        self.filler = fill if isinstance(fill, FieldFiller) else FieldFiller.from_spec(fill or FILL, self.policy)
+        self.verifier = verifier or LoginVerifier.from_spec(LOGIN_VERIFY, LOGIN_COOKIES)
+        self.login_budget = login_budget or LOGIN_BUDGET
+        self.cart_budget = cart_budget or CART_BUDGET
+        self.base_url = (base_url or BASE_URL).rstrip("/")
+        self.cart_mode = cart_mode or CART_MODE
+        self.http = None
+        # Status, cart token and item count of the last add-to-cart response, when known
+        self.last_cart_response = None
+        # Cookies restored from a cached session, applied to the browser on first use
+        self.pending_cookies = []
+        self.driver = None
+        self.fresh = False
+        # Serializes command sequences when the driver is shared between threads
+        self.lock = threading.RLock()
+        # Held while the driver is closed; the same lock here (see ContextSession)
+        self.close_lock = self.lock
+        # Step-by-step progress of login / add-to-cart (see kigoauto_events)
+        self.events = StepEvents()
+        self.events.subscribe(metrics.record_step)
+        _instances.add(self)
         self.install(headless=headless)
 
     def install(self, headless=False):
+        install_started = time.time()
         # Setup Chrome options
         chrome_options = webdriver.ChromeOptions()
         if headless:
@@ -33,49 +130,81 @@ class KigoAutoLogin:
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
+        if self.network_capture:
+            enable_network_log(chrome_options)
         
         # Better user agent to avoid detection
         chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         
         # Create a unique user data directory to avoid conflicts
-        self.user_data_dir = tempfile.mkdtemp(prefix="chrome_user_data_")
+        phase_started = time.time()
+        if self.fixed_user_data_dir:
+            self.user_data_dir = self.fixed_user_data_dir
+        elif self.profile_template is not None:
+            self.profile_template.ensure_built(self._build_profile_template)
+            self.user_data_dir = self.profile_template.clone()
+        else:
+            self.user_data_dir = tempfile.mkdtemp(prefix="chrome_user_data_")
         chrome_options.add_argument(f"--user-data-dir={self.user_data_dir}")
+        metrics.observe("kigoauto_install_phase_seconds", time.time() - phase_started, phase="profile")
         
         # Initialize driver with better error handling
         self.driver = None
         initialization_methods = [
-            ("WebDriver Manager", self._init_with_manager, chrome_options),
+            ("Resolved ChromeDriver", self._init_with_manager, chrome_options),
             ("System Chrome", self._init_system_chrome, chrome_options),
             ("Direct Chrome", self._init_direct_chrome, chrome_options)
         ]
         
-        for method_name, method, options in initialization_methods:
+        for attempt, (method_name, method, options) in enumerate(initialization_methods):
+            phase_started = time.time()
             try:
                 print(f"Trying to initialize Chrome with: {method_name}")
                 self.driver = method(options)
                 if self.driver:
                     print(f"Successfully initialized Chrome with: {method_name}")
+                    metrics.inc("kigoauto_driver_init_total", method=method_name, outcome="ok")
+                    if attempt:
+                        metrics.inc("kigoauto_driver_init_fallbacks_total", method=method_name)
                     break
             except Exception as e:
                 print(f"Failed with {method_name}: {str(e)}")
+                metrics.inc("kigoauto_driver_init_total", method=method_name, outcome="error")
                 continue
+            finally:
+                metrics.observe("kigoauto_install_phase_seconds", time.time() - phase_started,
+                                phase="launch", method=method_name)
         
         if not self.driver:
+            metrics.observe("kigoauto_driver_install_seconds", time.time() - install_started, outcome="error")
             raise WebDriverException(
                 "Failed to initialize Chrome WebDriver. Please ensure Chrome and ChromeDriver are installed.\n"
                 "You can install ChromeDriver manually or let webdriver-manager handle it automatically."
             )
         
-        self.wait = WebDriverWait(self.driver, 180)
+        self.blocker = ResourceBlocker(self.driver)
+        self.launched_at = time.time()
+        self.page_loads = 0
+        self.fresh = True
+        metrics.observe("kigoauto_driver_install_seconds", self.launched_at - install_started, outcome="ok")
     
-    def _init_with_manager(self, options):
-        """Initialize Chrome using webdriver-manager to auto-download the driver"""
+    def _build_profile_template(self, template_dir):
+        """Launch Chrome once on the template directory so first-run state and the storefront's assets are cached"""
+        builder = KigoAutoLogin(headless=self.headless, base_url=self.base_url, humanize="fast",
+                                selector_cache=self.selector_cache, user_data_dir=template_dir)
         try:
-            service = Service(ChromeDriverManager().install())
-            return webdriver.Chrome(service=service, options=options)
-        except Exception as e:
-            print(f"WebDriver Manager error: {e}")
-            raise
+            builder.driver.get(builder.base_url)
+            LatencyBudget(60, "profile warmup").try_wait(builder.driver, page_ready)
+        finally:
+            builder.close()
+
+    def _init_with_manager(self, options):
+        """Initialize Chrome with the ChromeDriver resolved once per process (see resolve_chromedriver)"""
+        driver_path = resolve_chromedriver()
+        if not driver_path:
+            raise chromedriver_error() or FileNotFoundError("ChromeDriver could not be resolved")
+        service = Service(driver_path)
+        return webdriver.Chrome(service=service, options=options)
     
     def _init_system_chrome(self, options):
         """Try to use Chrome from system PATH"""
@@ -92,28 +221,31 @@ class KigoAutoLogin:
         for chrome_path in common_paths:
             if os.path.exists(chrome_path):
                 options.binary_location = chrome_path
-                # Try to find or download ChromeDriver
-                try:
-                    service = Service(ChromeDriverManager().install())
-                    return webdriver.Chrome(service=service, options=options)
-                except:
-                    return webdriver.Chrome(options=options)
+                # Use the memoized ChromeDriver if there is one
+                driver_path = resolve_chromedriver()
+                if driver_path:
+                    return webdriver.Chrome(service=Service(driver_path), options=options)
+                return webdriver.Chrome(options=options)
         
         raise FileNotFoundError("Chrome not found in common installation paths")
     
     def human_like_delay(self, min_seconds=0.5, max_seconds=2.0):
-        """Add random human-like delay"""
-        time.sleep(random.uniform(min_seconds, max_seconds))
-    
-    def human_like_typing(self, element, text):
-        """Type text with human-like delays between keystrokes"""
-        element.clear()
-        for char in text:
-            element.send_keys(char)
-            time.sleep(random.uniform(0.05, 0.2))
+        """Add random human-like delay, scaled by the humanization policy"""
+        with metrics.span("kigoauto_pause_seconds", kind="delay"):
+            self.policy.pause(min_seconds, max_seconds)
     
+    def fill_field(self, element, text, field):
+        """Enter ``text`` into a form field with the fill strategy configured for ``field``"""
+        if self.filler.strategy_for(field) in ("keys", "human"):
+            # Keyboard strategies type into the focused element, like a user who clicked it
+            self.move_mouse_naturally(element)
+            element.click()
+        return self.filler.fill(self.driver, element, text, field)
+
     def move_mouse_naturally(self, element):
         """Move mouse to element in a natural way"""
+        if not self.policy.mouse_moves:
+            return
         try:
             # Check if element is visible before moving to it
             if element.is_displayed():
@@ -124,25 +256,58 @@ class KigoAutoLogin:
             # If element is not interactable, skip the mouse movement
             pass
     
+    def use_resource_blocking(self, operation):
+        """Turn request blocking on or off for the operation about to run"""
+        if self.blocker is None:
+            return
+        blocked = operation in self.block_resources
+        if blocked and self.blocker.supported and self.blocker.stats.sample_due(operation):
+            # Now and then load unblocked, so /resource-stats has a baseline to measure savings against
+            print(f"Loading {operation} pages unblocked to sample the resource baseline")
+            blocked = False
+        self.blocker.set_enabled(blocked)
+
+    def record_page(self, kind):
+        """Record bytes transferred (and saved by blocking) for the page just loaded"""
+        self.page_loads += 1
+        if self.blocker is not None:
+            self.blocker.record_page(kind)
+
+    def email_field_present(self, driver):
+        """Wait condition: the login form's email field is on the page"""
+        return driver.find_elements(By.CSS_SELECTOR, "input[name='Email'], input[name='email' i]")
+
     def login(self, email, password):
         """
         Login to Kigoauto.com
         """
+        op = self.events.operation("login")
         try:
-            # Close any existing session and start fresh
-            self.close()
-            self.install(self.headless)
+            # Start from a fresh browser unless this one was just launched
+            # (e.g. handed out warm by a DriverPool)
+            op.step("prepare", relaunch=not self.fresh or self.driver is None)
+            if not self.fresh or self.driver is None:
+                self.close()
+                self.install(self.headless)
+            self.fresh = False
+            self.http = None
+            self.pending_cookies = []
+            budget = LatencyBudget(self.login_budget, "login")
+            self.use_resource_blocking("login")
             
             # Navigate to the main page first
+            op.step("landing")
             print("Navigating to Kigoauto.com...")
-            self.driver.get("http://kigoauto.com")
-            self.human_like_delay(3, 5)
+            self.driver.get(self.base_url)
             
-            # Check if Cloudflare challenge appears
+            # Wait out a Cloudflare challenge, if one appears
             print("Checking for Cloudflare challenge...")
-            time.sleep(5)  # Give time for Cloudflare to load
+            budget.wait(self.driver, page_ready, message="waiting for the landing page")
+            self.record_page("landing")
+            self.human_like_delay(3, 5)
             
             # Look for sign in link
+            op.step("sign_in")
             print("Looking for Sign In link...")
             sign_in_selectors = [
                 "a[href*='account']",
@@ -157,33 +322,28 @@ class KigoAutoLogin:
                 "//a[contains(text(), 'Sign Up')]"
             ]
             
-            sign_in_link = None
-            for selector in sign_in_selectors:
-                try:
-                    if selector.startswith("//"):
-                        elements = self.driver.find_elements(By.XPATH, selector)
-                    elif ":contains" in selector:
-                        text = selector.split("'")[1]
-                        elements = self.driver.find_elements(By.XPATH, f"//a[contains(text(), '{text}')]")
-                    else:
-                        elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    
-                    if elements:
-                        sign_in_link = elements[0]
-                        print(f"Found sign in link with selector: {selector}")
-                        break
-                except Exception as e:
-                    continue
+            resolver = SelectorResolver(self.driver, self.selector_cache)
+            # Prefer a visible, enabled link; otherwise take any match and click it with JavaScript
+            sign_in_link, selector = resolver.resolve(sign_in_selectors, visible=True, enabled=True,
+                                                      key="login.sign_in")
+            clickable = sign_in_link is not None
+            if not clickable:
+                sign_in_link, selector = resolver.resolve(sign_in_selectors, visible=False)
             
             if sign_in_link:
+                print(f"Found sign in link with selector: {selector}")
+                op.note(selector=selector)
                 try:
                     # Try to click normally first
-                    if sign_in_link.is_displayed() and sign_in_link.is_enabled():
+                    landing_url = self.driver.current_url
+                    if clickable:
                         self.move_mouse_naturally(sign_in_link)
                         sign_in_link.click()
                     else:
                         # Use JavaScript click as fallback
                         self.driver.execute_script("arguments[0].click();", sign_in_link)
+                    budget.try_wait(self.driver, any_of(url_changed_from(landing_url), self.email_field_present), timeout=15)
+                    budget.wait(self.driver, page_ready, message="waiting for the login page")
                     self.human_like_delay(2, 3)
                 except Exception as e:
                     print(f"Could not click sign in link: {e}")
@@ -192,21 +352,22 @@ class KigoAutoLogin:
                     if href:
                         print(f"Navigating directly to: {href}")
                         self.driver.get(href)
+                        budget.wait(self.driver, page_ready, message="waiting for the login page")
                         self.human_like_delay(2, 3)
             else:
                 # Try direct navigation to common login URLs
                 print("Sign in link not found, trying direct navigation...")
                 login_urls = [
-                    "http://kigoauto.com/account/login",
-                    "http://kigoauto.com/customer/account/login",
-                    "http://kigoauto.com/account",
-                    "http://kigoauto.com/login"
+                    f"{self.base_url}/account/login",
+                    f"{self.base_url}/customer/account/login",
+                    f"{self.base_url}/account",
+                    f"{self.base_url}/login"
                 ]
                 
                 for url in login_urls:
                     print(f"Trying: {url}")
                     self.driver.get(url)
-                    self.human_like_delay(2, 3)
+                    budget.wait(self.driver, page_ready, message=f"waiting for {url}")
                     
                     if "login" in self.driver.current_url.lower() or "account" in self.driver.current_url.lower():
                         print(f"Successfully navigated to: {self.driver.current_url}")
@@ -215,6 +376,7 @@ class KigoAutoLogin:
             print(f"Current URL: {self.driver.current_url}")
             
             # Find and fill email field
+            op.step("email_field")
             print("Looking for email field...")
             # Use the exact selector based on the HTML provided
             email_selectors = [
@@ -225,22 +387,16 @@ class KigoAutoLogin:
                 "input[type='text'][name='Email']"
             ]
             
-            email_field = None
-            for selector in email_selectors:
-                try:
-                    email_field = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                    if email_field.is_displayed():
-                        print(f"Found email field with selector: {selector}")
-                        break
-                    else:
-                        email_field = None
-                except:
-                    continue
-            
-            if not email_field:
+            found = budget.try_wait(self.driver, resolver.condition(email_selectors, key="login.email"), timeout=30, poll=0.25)
+            if not found:
                 raise Exception("Could not find email field")
+            self.record_page("login")
+            email_field, selector = found
+            print(f"Found email field with selector: {selector}")
+            op.note(selector=selector)
             
             # Find password field
+            op.step("password_field")
             print("Looking for password field...")
             # Use the exact selector based on the HTML provided
             password_selectors = [
@@ -251,32 +407,20 @@ class KigoAutoLogin:
                 "input[type='password']"  # Generic fallback
             ]
             
-            password_field = None
-            for selector in password_selectors:
-                try:
-                    password_field = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    if password_field.is_displayed():
-                        print(f"Found password field with selector: {selector}")
-                        break
-                    else:
-                        password_field = None
-                except:
-                    continue
-            
+            password_field, selector = resolver.resolve(password_selectors, key="login.password")
             if not password_field:
                 raise Exception("Could not find password field")
+            print(f"Found password field with selector: {selector}")
+            op.note(selector=selector)
             
             # Fill in credentials with human-like behavior
+            op.step("type_credentials")
             print("Entering credentials...")
-            self.move_mouse_naturally(email_field)
-            email_field.click()
-            self.human_like_typing(email_field, email)
-            
-            self.move_mouse_naturally(password_field)
-            password_field.click()
-            self.human_like_typing(password_field, password)
+            self.fill_field(email_field, email, "email")
+            self.fill_field(password_field, password, "password")
             
             # Find and click submit button
+            op.step("submit")
             print("Looking for submit button...")
             submit_selectors = [
                 "button.signbtn.signin",  # Based on the class we saw in exploration
@@ -289,25 +433,13 @@ class KigoAutoLogin:
                 "//button[contains(@class, 'signbtn')]"
             ]
             
-            submit_button = None
-            for selector in submit_selectors:
-                try:
-                    if selector.startswith("//"):
-                        submit_button = self.driver.find_element(By.XPATH, selector)
-                    elif ":contains" in selector:
-                        text = selector.split("'")[1]
-                        submit_button = self.driver.find_element(By.XPATH, f"//button[contains(text(), '{text}')]")
-                    else:
-                        submit_button = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    
-                    if submit_button and submit_button.is_displayed():
-                        print(f"Found submit button with selector: {selector}")
-                        break
-                    else:
-                        submit_button = None
-                except:
-                    continue
+            submit_button, selector = resolver.resolve(submit_selectors, key="login.submit")
+            if submit_button:
+                print(f"Found submit button with selector: {selector}")
+                op.note(selector=selector)
             
+            # Snapshot the signals the verifier compares against once the form is sent
+            verify_state = self.verifier.prepare(self.driver)
             if submit_button:
                 self.move_mouse_naturally(submit_button)
                 submit_button.click()
@@ -316,52 +448,285 @@ class KigoAutoLogin:
                 print("Submit button not found, pressing Enter...")
                 password_field.send_keys(Keys.RETURN)
             
-            # Wait for login to complete
-            self.human_like_delay(3, 5)
+            # Wait for the first login signal (session cookie, logout control, URL
+            # transition) or for the form to come back with an error
+            op.step("verify")
+            verdict = budget.try_wait(self.driver, self.verifier.condition(verify_state), timeout=20, poll=0.25)
+            outcome, detail = verdict or ("failure", "no login signal within 20s")
+            print(f"Current URL after login: {self.driver.current_url}")
+            op.note(outcome=outcome, signal=detail if outcome == "success" else None)
             
-            # Check if login was successful
-            current_url = self.driver.current_url
-            page_source = self.driver.page_source.lower()
-            
-            print(f"Current URL after login: {current_url}")
-            
-            success_indicators = [
-                "account" in current_url and "login" not in current_url,
-                "dashboard" in current_url,
-                "logout" in page_source,
-                "log out" in page_source,
-                "sign out" in page_source,
-                "my account" in page_source,
-                "welcome" in page_source and email.lower() in page_source
-            ]
-            
-            if any(success_indicators):
-                print("Login successful!")
+            if outcome == "success":
+                print(f"Login successful! (signal: {detail})")
                 # Navigate to a product page or cart
-                self.driver.get("http://kigoauto.com/cart")
-                self.human_like_delay(2, 3)
+                op.step("cart")
+                self.use_resource_blocking("cart")
+                self.driver.get(f"{self.base_url}/cart")
+                budget.try_wait(self.driver, page_ready)
+                self.record_page("cart")
+                op.finish(True, signal=detail)
                 return True
             else:
-                print("Login may have failed or requires additional verification")
+                print(f"Login may have failed or requires additional verification: {detail}")
+                op.finish(False, error=detail)
                 return False
                 
         except Exception as e:
+            op.fail(e)
             print(f"Login error: {str(e)}")
             import traceback
             traceback.print_exc()
             return False
     
-    def add_products(self, product_url, quantity):
+    def add_products(self, product_url, quantity, mode=None):
         """
         Add products to the cart on Kigoauto.com
+
+        ``mode`` overrides ``self.cart_mode``: "http" replays the add-to-cart form
+        with the session cookies, "browser" drives Chrome, and "auto" tries the
+        HTTP path first and falls back to the browser on a challenge.
+        """
+        mode = mode or self.cart_mode
+        self.last_cart_response = None
+        if mode in ("http", "auto"):
+            try:
+                return self.add_products_http(product_url, quantity)
+            except ChallengeDetected as e:
+                if mode == "http":
+                    print(f"❌ HTTP add to cart blocked: {e}")
+                    return False
+                print(f"HTTP add to cart blocked ({e}), falling back to the browser")
+            except Exception as e:
+                print(f"❌ Error adding product over HTTP: {str(e)}")
+                return False
+        return self.add_products_browser(product_url, quantity)
+
+    def http_client(self):
+        """Return the cookie-replay HTTP client, seeding it from the browser cookies on first use"""
+        if self.http is None:
+            cookies = self.driver.get_cookies() if self.driver else []
+            self.http = CartHttpClient(cookies)
+        return self.http
+
+    def add_products_http(self, product_url, quantity):
+        """Add products to the cart by replaying the product form over HTTP, without the browser"""
+        print(f"Adding product over HTTP: {product_url}")
+        op = self.events.operation("add_to_cart_http", url=product_url, quantity=quantity)
+        start = time.time()
+        try:
+            op.step("post_form")
+            result = self.http_client().add_to_cart(product_url, quantity)
+        except Exception as e:
+            op.fail(e)
+            raise
+        self.last_cart_response = {
+            "status": result["first_status"],
+            "final_status": result["status_code"],
+            "cart_url": result["url"],
+            "cart_token": result["cart_token"],
+            "cart_count": result["cart_count"],
+            "error": None,
+            "source": "http",
+        }
+        op.finish(True, status_code=result["status_code"], cart_count=result["cart_count"])
+        print(f"✓ Successfully added {quantity} item(s) to cart over HTTP "
+              f"(HTTP {result['status_code']}, {time.time() - start:.2f}s)")
+        return True
+
+    def add_products_batch(self, items, concurrency=4, mode=None):
+        """
+        Add several (product_url, quantity) items to the cart in one session.
+
+        Over HTTP the items are pipelined across ``concurrency`` threads sharing the
+        session's connection pool. Items run one at a time until one succeeds and
+        the cookie jar holds a cart cookie, so parallel adds all reuse that cart
+        instead of each creating their own. Items the HTTP path cannot handle
+        (challenge pages in "auto" mode) and all items in "browser" mode go through
+        the browser one after another. Returns one result dict per item, in order.
         """
+        mode = mode or self.cart_mode
+        op = self.events.operation("add_to_cart_batch", items=len(items))
+        results = [None] * len(items)
+        browser_items = []
+        challenged = threading.Event()
+
+        def add_over_http(index):
+            product_url, quantity = items[index]
+            start = time.time()
+            if challenged.is_set():
+                browser_items.append(index)
+                return
+            try:
+                response = self.http_client().add_to_cart(product_url, quantity)
+                results[index] = self._batch_result(product_url, quantity, True, "http", start,
+                                                    status_code=response["status_code"])
+                op.record("http_item", start, url=product_url, quantity=quantity)
+            except ChallengeDetected as e:
+                if mode == "http":
+                    results[index] = self._batch_result(product_url, quantity, False, "http", start, error=str(e))
+                else:
+                    challenged.set()
+                    browser_items.append(index)
+                op.record("http_item", start, "error", url=product_url, error=str(e))
+            except Exception as e:
+                results[index] = self._batch_result(product_url, quantity, False, "http", start, error=str(e))
+                op.record("http_item", start, "error", url=product_url, error=str(e))
+
+        def cart_exists():
+            return any("cart" in cookie["name"].lower() for cookie in self.http_client().get_cookies())
+
+        if mode in ("http", "auto") and items:
+            print(f"Adding {len(items)} products over HTTP with concurrency {concurrency}")
+            pending = 0
+            while pending < len(items) and not challenged.is_set():
+                add_over_http(pending)
+                pending += 1
+                if results[pending - 1] is not None and results[pending - 1]["status"] == "success" and cart_exists():
+                    break
+            if challenged.is_set():
+                # A challenge sends the rest through the browser, like the item that met it
+                browser_items.extend(range(pending, len(items)))
+            elif pending < len(items):
+                # Each worker thread gets a copy of the caller's context, so its events reach the same observer
+                context = contextvars.copy_context()
+                with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items) - pending))) as pool:
+                    list(pool.map(lambda index: context.copy().run(add_over_http, index), range(pending, len(items))))
+        else:
+            browser_items = list(range(len(items)))
+
+        if browser_items:
+            print(f"Adding {len(browser_items)} products through the browser")
+        for index in sorted(browser_items):
+            product_url, quantity = items[index]
+            start = time.time()
+            try:
+                success = self.add_products_browser(product_url, quantity)
+                results[index] = self._batch_result(product_url, quantity, success, "browser", start,
+                                                    error=None if success else "Failed to add product to cart")
+            except Exception as e:
+                results[index] = self._batch_result(product_url, quantity, False, "browser", start, error=str(e))
+        op.finish(all(result["status"] == "success" for result in results),
+                  added=sum(1 for result in results if result["status"] == "success"))
+        return results
+
+    @staticmethod
+    def _batch_result(product_url, quantity, success, mode, start, status_code=None, error=None):
+        result = {
+            "url": product_url,
+            "quantity": quantity,
+            "status": "success" if success else "fail",
+            "mode": mode,
+            "seconds": round(time.time() - start, 3),
+        }
+        if status_code is not None:
+            result["status_code"] = status_code
+        if error:
+            result["error"] = error
+        return result
+
+    def read_cart(self, mode=None):
+        """
+        Read the cart's line items and totals (see ``kigoauto_cart.parse_cart``).
+
+        Over HTTP the cart page is fetched with the session cookies and parsed,
+        without touching the browser; "auto" falls back to loading the cart in the
+        browser on a challenge, like ``add_products``. The result says which
+        ``source`` it came from.
+        """
+        mode = mode or self.cart_mode
+        cart_url = f"{self.base_url}/cart"
+        if mode in ("http", "auto"):
+            try:
+                # Seeding the client reads the browser cookies, which needs the driver
+                with self.lock:
+                    client = self.http_client()
+                return dict(client.get_cart(cart_url), source="http")
+            except ChallengeDetected as e:
+                if mode == "http":
+                    raise
+                print(f"HTTP cart read blocked ({e}), reading the cart in the browser")
+        with self.lock:
+            return self.read_cart_browser(cart_url)
+
+    def read_cart_browser(self, cart_url=None):
+        """Load the cart page in the browser and parse what it rendered"""
+        self.apply_pending_cookies()
+        self.use_resource_blocking("cart")
+        self.driver.get(cart_url or f"{self.base_url}/cart")
+        LatencyBudget(self.cart_budget, "cart status").wait(self.driver, page_ready)
+        self.record_page("cart")
+        return dict(parse_cart(self.driver.page_source), cart_url=self.driver.current_url, source="browser")
+
+    def restore_session(self, cookies, http=None):
+        """
+        Reuse cookies from an earlier login instead of logging in again.
+
+        The HTTP client picks them up immediately; the browser only gets them
+        when a browser step actually runs (see ``apply_pending_cookies``).
+        """
+        if self.http is not None:
+            self.http.close()
+        self.http = http or CartHttpClient(cookies)
+        self.pending_cookies = list(cookies)
+        self.fresh = False
+
+    def apply_pending_cookies(self):
+        """
+        Bring the browser's cookies up to date before a browser step: cookies of a
+        restored session, and whatever the HTTP client picked up since (e.g. the
+        cart token of an HTTP add-to-cart), so both keep using the same cart.
+        """
+        cookies = {cookie["name"]: cookie for cookie in self.pending_cookies}
+        if self.http is not None:
+            for cookie in self.http.get_cookies():
+                cookies[cookie["name"]] = cookie
+        self.pending_cookies = []
+        if not cookies:
+            return
+        on_storefront = self.driver.current_url.startswith(self.base_url)
+        if on_storefront:
+            known = {cookie["name"]: cookie.get("value") for cookie in self.driver.get_cookies()}
+            cookies = {name: cookie for name, cookie in cookies.items() if known.get(name) != cookie.get("value")}
+            if not cookies:
+                return
+        else:
+            # Cookies can only be added for the domain of the page currently loaded
+            self.driver.get(self.base_url)
+        for cookie in cookies.values():
+            cookie = {key: value for key, value in cookie.items() if key in (
+                "name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")}
+            if cookie.get("expiry") is not None:
+                cookie["expiry"] = int(cookie["expiry"])
+            try:
+                self.driver.add_cookie(cookie)
+            except Exception:
+                # Retry without the domain, e.g. for host-only cookies
+                cookie.pop("domain", None)
+                try:
+                    self.driver.add_cookie(cookie)
+                except Exception as e:
+                    print(f"Could not restore cookie {cookie['name']}: {e}")
+
+    def add_products_browser(self, product_url, quantity):
+        """
+        Add products to the cart by driving the browser through the product page
+        """
+        op = self.events.operation("add_to_cart", url=product_url, quantity=quantity)
         try:
             # Navigate to product page
+            op.step("product_page")
+            self.apply_pending_cookies()
+            budget = LatencyBudget(self.cart_budget, "add to cart")
             print(f"Navigating to product: {product_url}")
+            self.fresh = False
+            self.use_resource_blocking("product")
             self.driver.get(product_url)
-            self.human_like_delay(3, 5)  # Give more time for product page to load
+            budget.wait(self.driver, page_ready, message="waiting for the product page")
+            self.record_page("product")
+            self.human_like_delay(3, 5)
             
             # Look for quantity input using the exact selectors provided
+            op.step("quantity")
             print("Looking for quantity field...")
             qty_selectors = [
                 "#quantity",  # Exact ID provided
@@ -371,35 +736,27 @@ class KigoAutoLogin:
                 "input[id='quantity']"  # Alternative ID selector
             ]
             
+            # Wait until the product form renders; the add button alone also counts
+            resolver = SelectorResolver(self.driver, self.selector_cache)
             qty_field = None
-            for selector in qty_selectors:
-                try:
-                    qty_field = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                    if qty_field.is_displayed():
-                        print(f"Found quantity field with selector: {selector}")
-                        break
-                    else:
-                        qty_field = None
-                except:
-                    continue
+            found = budget.try_wait(self.driver, resolver.condition(qty_selectors + ["#addtocart_button"],
+                                                                    key="product.quantity"),
+                                    timeout=20, poll=0.25)
+            if found and found[1] in qty_selectors:
+                qty_field, selector = found
+                print(f"Found quantity field with selector: {selector}")
+                op.note(selector=selector)
             
             if qty_field:
-                # Clear and set quantity
-                self.move_mouse_naturally(qty_field)
-                qty_field.click()
-                
-                # Clear the field using multiple methods to ensure it's empty
-                qty_field.clear()
-                qty_field.send_keys(Keys.CONTROL + "a")  # Select all
-                qty_field.send_keys(Keys.DELETE)  # Delete
-                
-                # Type the new quantity
-                self.human_like_typing(qty_field, str(quantity))
+                # Replace the quantity; every fill strategy overwrites the old value
+                strategy = self.fill_field(qty_field, str(quantity), "quantity")
+                op.note(fill=strategy)
                 print(f"Set quantity to: {quantity}")
             else:
                 print("Warning: Quantity field not found, will try to add with default quantity")
             
             # Look for add to cart button using the exact selector provided
+            op.step("add_to_cart")
             print("Looking for add to cart button...")
             add_cart_selectors = [
                 "#addtocart_button",  # Exact ID provided
@@ -411,81 +768,97 @@ class KigoAutoLogin:
                 "button[type='submit']"  # Generic fallback
             ]
             
-            add_button = None
-            for selector in add_cart_selectors:
-                try:
-                    if selector.startswith("//"):
-                        add_button = self.driver.find_element(By.XPATH, selector)
-                    else:
-                        add_button = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    
-                    if add_button and add_button.is_displayed() and add_button.is_enabled():
-                        print(f"Found add to cart button with selector: {selector}")
-                        break
-                    else:
-                        add_button = None
-                except:
-                    continue
-            
+            add_button, selector = resolver.resolve(add_cart_selectors, enabled=True, key="product.add_to_cart")
             if add_button:
+                print(f"Found add to cart button with selector: {selector}")
+                op.note(selector=selector)
                 # Click the add to cart button
                 self.move_mouse_naturally(add_button)
                 
+                # Drop the product page's network events, so the first cart request seen is ours
+                watcher = None
+                if self.network_capture:
+                    action = self.driver.execute_script(
+                        "return arguments[0].form ? arguments[0].form.action : null;", add_button)
+                    watcher = CartResponseWatcher(self.driver, action, origin=self.driver.current_url).start()
+                
                 # Try multiple click methods
+                product_page_url = self.driver.current_url
                 try:
                     add_button.click()
                 except:
                     # If regular click fails, try JavaScript click
                     self.driver.execute_script("arguments[0].click();", add_button)
                 
-                print(f"✓ Successfully added {quantity} item(s) to cart")
-                self.human_like_delay(2, 3)
+                op.step("confirm")
+                if watcher is not None and watcher.supported:
+                    # Done as soon as the cart request's response has arrived
+                    response = budget.try_wait(self.driver, watcher.condition, timeout=10, poll=0.1)
+                    if response is not None:
+                        return self._confirm_add_response(op, response, quantity)
+                    print("Warning: No add-to-cart request seen, confirming from the page")
                 
-                # Check if we were redirected to cart or if a success message appeared
-                current_url = self.driver.current_url
-                if "cart" in current_url.lower():
+                # No network events: either the page navigates (e.g. to the cart) or the add happens over XHR
+                budget.try_wait(self.driver, any_of(url_changed_from(product_page_url), network_idle()), timeout=10)
+                if "cart" in self.driver.current_url.lower():
                     print("✓ Redirected to cart page - item added successfully")
-                else:
-                    # Look for success notification
-                    try:
-                        # Common selectors for success messages
-                        success_selectors = [
-                            ".success-message",
-                            ".alert-success",
-                            ".notification-success",
-                            "[class*='success']",
-                            "[class*='added-to-cart']"
-                        ]
-                        
-                        for selector in success_selectors:
-                            try:
-                                success_msg = self.driver.find_element(By.CSS_SELECTOR, selector)
-                                if success_msg.is_displayed():
-                                    print(f"✓ Success message found: {success_msg.text[:50]}...")
-                                    break
-                            except:
-                                pass
-                    except:
-                        pass
+                print(f"✓ Successfully added {quantity} item(s) to cart")
                 
-                # Wait a moment to ensure the action completes
-                self.human_like_delay(2, 3)
+                # The add may have set a new cart token in the browser; keep the HTTP client's jar current
+                if self.http is not None:
+                    self.http.load_cookies(self.driver.get_cookies())
                 
+                op.finish(True)
                 return True
             else:
                 print("❌ Could not find add to cart button")
+                op.finish(False)
                 return False
                 
         except Exception as e:
+            op.fail(e)
             print(f"❌ Error adding product: {str(e)}")
             import traceback
             traceback.print_exc()
             return False
     
+    def _confirm_add_response(self, op, response, quantity):
+        """Finish a browser add-to-cart from the captured response of its cart request"""
+        cookies = self.driver.get_cookies()
+        if response["cart_token"] is None:
+            # The token was set earlier (or by a script); read it from the browser
+            response["cart_token"] = next((cookie.get("value") for cookie in cookies
+                                           if "cart" in cookie["name"].lower()), None)
+        self.last_cart_response = dict(response, source="browser")
+        final_url = (response["cart_url"] or "").lower()
+        if response["error"] or response["status"] is None or response["status"] >= 400 \
+                or (response["final_status"] or 0) >= 400:
+            print(f"❌ Add to cart request failed: HTTP {response['status']} {response['error'] or ''}".rstrip())
+            op.finish(False, **response)
+            return False
+        if any(marker in final_url for marker in LOGIN_PATH_MARKERS):
+            print("❌ Add to cart was redirected to the login page")
+            op.finish(False, **dict(response, error="login required"))
+            return False
+        
+        # The add may have set a new cart token in the browser; keep the HTTP client's jar current
+        if self.http is not None:
+            self.http.load_cookies(cookies)
+        count = f", {response['cart_count']} in cart" if response["cart_count"] is not None else ""
+        print(f"✓ Successfully added {quantity} item(s) to cart (HTTP {response['status']}{count})")
+        op.finish(True, **response)
+        return True
+    
     def get_cookies(self):
         """Get all cookies from the current session"""
         try:
-            cookies = self.driver.get_cookies()
+            cookies = self.driver.get_cookies() if self.driver else []
+            if self.http is not None:
+                # Cookies set by HTTP fast-path requests (e.g. a new cart token) win
+                merged = {cookie["name"]: cookie for cookie in cookies}
+                for cookie in self.http.get_cookies():
+                    merged[cookie["name"]] = cookie
+                cookies = list(merged.values())
             return cookies
         except Exception as e:
             print(f"Error getting cookies: {str(e)}")
@@ -518,17 +891,99 @@ class KigoAutoLogin:
             print(f"Error loading cookies: {str(e)}")
             return False
     
+    def health(self, ping_timeout=5):
+        """
+        Ping the browser with a trivial script and report its state: ``alive``,
+        ``error`` when the ping failed or hung past ``ping_timeout`` seconds,
+        ``rss_bytes`` of ChromeDriver plus its Chrome processes, ``page_loads``
+        and ``age`` in seconds.
+        """
+        report = {
+            "alive": False,
+            "page_loads": getattr(self, "page_loads", 0),
+            "age": round(time.time() - self.launched_at, 1) if getattr(self, "launched_at", None) else None,
+            "rss_bytes": None,
+        }
+        driver = self.driver
+        if driver is None:
+            report["error"] = "no browser"
+            return report
+
+        outcome = {}
+        def ping():
+            try:
+                outcome["value"] = driver.execute_script("return 1")
+            except Exception as e:
+                outcome["error"] = e
+
+        # A hung Chrome would block the WebDriver call for minutes, so ping on a side thread
+        pinger = threading.Thread(target=ping, name="driver-ping", daemon=True)
+        pinger.start()
+        pinger.join(ping_timeout)
+        if pinger.is_alive():
+            report["error"] = f"no answer within {ping_timeout}s"
+        elif "error" in outcome:
+            message = str(outcome["error"]).strip()
+            report["error"] = message.splitlines()[0] if message else type(outcome["error"]).__name__
+        else:
+            report["alive"] = True
+
+        process = getattr(getattr(driver, "service", None), "process", None)
+        if process is not None:
+            report["rss_bytes"] = process_tree_rss(process.pid)
+        return report
+
+    def recover(self, cookies=None):
+        """
+        Replace the browser with a newly launched one and carry the session over.
+
+        Cookies are read from the old browser unless ``cookies`` is given (the
+        caller's last known jar, for a browser that no longer answers); cookies
+        from the HTTP client win either way. They reach the new browser lazily,
+        like a cached session (see ``restore_session``).
+        """
+        http = self.http
+        if cookies is None:
+            cookies = self.get_cookies()
+        elif http is not None:
+            merged = {cookie["name"]: cookie for cookie in cookies}
+            for cookie in http.get_cookies():
+                merged[cookie["name"]] = cookie
+            cookies = list(merged.values())
+        cookies = cookies or self.pending_cookies
+        # Keep the HTTP client (and its connection pool) across the relaunch
+        self.http = None
+        self.close()
+        self.install(self.headless)
+        if cookies:
+            self.restore_session(cookies, http=http)
+        elif http is not None:
+            http.close()
+
     def close(self):
         """Close the browser and cleanup"""
         try:
+            if self.http is not None:
+                self.http.close()
+                self.http = None
             if self.driver:
-                self.driver.quit()
+                driver = self.driver
+                self.driver = None
+                try:
+                    driver.quit()
+                except Exception as e:
+                    # Crashed or hung browser: make sure ChromeDriver and its Chrome go away anyway
+                    print(f"Warning: Could not quit the browser cleanly ({e}), stopping ChromeDriver")
+                    service = getattr(driver, "service", None)
+                    if service is not None:
+                        service.stop()
+            self.fresh = False
                 
-            # Cleanup temporary user data directory
-            if hasattr(self, 'user_data_dir') and os.path.exists(self.user_data_dir):
-                import shutil
-                shutil.rmtree(self.user_data_dir)
-                print(f"Cleaned up temporary directory: {self.user_data_dir}")
+            # Cleanup temporary user data directory in the background
+            if hasattr(self, 'user_data_dir') and self.user_data_dir != self.fixed_user_data_dir \
+                    and os.path.exists(self.user_data_dir):
+                discard_profile_dir(self.user_data_dir)
+                print(f"Scheduled cleanup of temporary directory: {self.user_data_dir}")
         except Exception as e:
             print(f"Warning: Could not cleanup properly: {e}")
 
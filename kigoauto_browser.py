@@ -0,0 +1,444 @@
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+
+from webdriver_manager.chrome import ChromeDriverManager
+
+# No-egress nodes: never let webdriver-manager or Selenium Manager reach the network
+OFFLINE = os.environ.get("KIGOAUTO_OFFLINE", "").lower() in ("1", "true", "yes")
+
+_chromedriver_lock = threading.Lock()
+_chromedriver_resolved = False
+_chromedriver_path = None
+_chromedriver_error = None
+
+
+def resolve_chromedriver(offline=None):
+    """
+    Return the ChromeDriver binary path, resolved once per process.
+
+    Looks at CHROMEDRIVER_PATH, then ``chromedriver`` on PATH (the Docker image
+    installs it at build time), and only then asks webdriver-manager, which may
+    probe versions or download. In offline mode webdriver-manager is skipped.
+    The outcome, including failure, is memoized and shared by every driver launch;
+    ``None`` means no driver could be resolved.
+    """
+    global _chromedriver_resolved, _chromedriver_path, _chromedriver_error
+    offline = OFFLINE if offline is None else offline
+    with _chromedriver_lock:
+        if _chromedriver_resolved:
+            return _chromedriver_path
+
+        if offline:
+            # Selenium Manager honours SE_OFFLINE for its own driver lookup
+            os.environ.setdefault("SE_OFFLINE", "true")
+
+        path = os.environ.get("CHROMEDRIVER_PATH")
+        if path and not os.path.exists(path):
+            print(f"Warning: CHROMEDRIVER_PATH {path} does not exist")
+            path = None
+        if not path:
+            path = shutil.which("chromedriver")
+        if not path and not offline:
+            try:
+                path = ChromeDriverManager().install()
+            except Exception as e:
+                _chromedriver_error = e
+                print(f"WebDriver Manager error: {e}")
+        if not path and offline:
+            _chromedriver_error = FileNotFoundError(
+                "ChromeDriver not found and offline mode forbids downloading it; set CHROMEDRIVER_PATH"
+            )
+
+        _chromedriver_path = path
+        _chromedriver_resolved = True
+        if path:
+            print(f"Using ChromeDriver at: {path}")
+        return path
+
+
+def chromedriver_error():
+    """Why ``resolve_chromedriver`` returned None, if it did"""
+    return _chromedriver_error
+
+
+def chromedriver_status():
+    """Whether ChromeDriver resolution has run, and the path or error it ended with"""
+    with _chromedriver_lock:
+        return {"resolved": _chromedriver_resolved, "path": _chromedriver_path,
+                "error": str(_chromedriver_error) if _chromedriver_error else None}
+
+
+def reset_chromedriver():
+    """Forget the memoized ChromeDriver path, e.g. after the binary was replaced"""
+    global _chromedriver_resolved, _chromedriver_path, _chromedriver_error
+    with _chromedriver_lock:
+        _chromedriver_resolved = False
+        _chromedriver_path = None
+        _chromedriver_error = None
+
+
+# Chrome lock files that must not be copied from the template into a session
+PROFILE_LOCK_FILES = {"SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile", "LOCK"}
+
+_profile_removals = []
+_profile_removal_cond = threading.Condition()
+_profile_remover = None
+
+
+def default_profile_root():
+    """Where per-session profiles go: /dev/shm when available (RAM-backed), else the temp dir"""
+    root = os.environ.get("KIGOAUTO_PROFILE_ROOT")
+    if root:
+        return root
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def discard_profile_dir(path):
+    """Delete a session profile directory on a background thread instead of in close()"""
+    global _profile_remover
+    with _profile_removal_cond:
+        _profile_removals.append(path)
+        if _profile_remover is None:
+            _profile_remover = threading.Thread(target=_remove_profiles, name="profile-cleanup", daemon=True)
+            _profile_remover.start()
+        _profile_removal_cond.notify()
+
+
+def _remove_profiles():
+    while True:
+        with _profile_removal_cond:
+            while not _profile_removals:
+                _profile_removal_cond.wait()
+            path = _profile_removals.pop(0)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def profile_dir_roots():
+    """Directories that may hold ``chrome_user_data_*`` session profiles"""
+    return sorted({default_profile_root(), tempfile.gettempdir()})
+
+
+def sweep_profile_dirs(live_dirs, min_age=600):
+    """
+    Schedule removal of ``chrome_user_data_*`` directories that no live driver
+    and no running Chrome uses and that have not been touched for ``min_age``
+    seconds (left behind by crashed drivers or killed workers). Returns the
+    directories scheduled.
+    """
+    live = {os.path.realpath(path) for path in live_dirs if path} | running_profile_dirs()
+    cutoff = time.time() - min_age
+    removed = []
+    for root in profile_dir_roots():
+        try:
+            names = os.listdir(root)
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            if not name.startswith("chrome_user_data_") or os.path.realpath(path) in live:
+                continue
+            try:
+                if not os.path.isdir(path) or os.path.getmtime(path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            discard_profile_dir(path)
+            removed.append(path)
+    return removed
+
+
+# Process helpers, based on /proc (Linux); elsewhere they find nothing
+
+def _proc_status(pid):
+    """Fields of /proc/<pid>/status as a dict, or None if the process is gone"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return dict(line.rstrip("\n").split(":\t", 1) for line in f if ":\t" in line)
+    except OSError:
+        return None
+
+
+def _proc_cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().decode(errors="replace").split("\0")
+    except OSError:
+        return []
+
+
+def _all_pids():
+    if not os.path.isdir("/proc"):
+        return []
+    return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+
+
+def running_profile_dirs():
+    """Profile directories passed as --user-data-dir to any running process"""
+    profiles = set()
+    for pid in _all_pids():
+        for argument in _proc_cmdline(pid):
+            if argument.startswith("--user-data-dir="):
+                profiles.add(os.path.realpath(argument.split("=", 1)[1]))
+    return profiles
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and all its descendants (ChromeDriver plus its Chrome processes)"""
+    children = {}
+    statuses = {}
+    for candidate in _all_pids():
+        status = _proc_status(candidate)
+        if status is None:
+            continue
+        statuses[candidate] = status
+        children.setdefault(int(status.get("PPid", "0")), []).append(candidate)
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        rss = statuses.get(current, {}).get("VmRSS", "0 kB").split()[0]
+        total += int(rss) * 1024
+        stack.extend(children.get(current, []))
+    return total
+
+
+def reap_zombie_children():
+    """Collect exited child processes (e.g. Chrome helpers whose driver crashed) left as zombies"""
+    reaped = 0
+    me = os.getpid()
+    for pid in _all_pids():
+        status = _proc_status(pid)
+        if not status or int(status.get("PPid", "0")) != me or not status.get("State", "").startswith("Z"):
+            continue
+        try:
+            os.waitpid(pid, os.WNOHANG)
+            reaped += 1
+        except ChildProcessError:
+            pass
+    return reaped
+
+
+def kill_orphaned_chrome(live_dirs):
+    """
+    Kill Chrome browser processes left without their ChromeDriver.
+
+    Only main browser processes on a ``chrome_user_data_*`` profile that no live
+    driver of this process owns are considered, and only when their parent is no
+    longer a ChromeDriver, so browsers of other workers on the host are left
+    alone. Their renderer/helper processes exit with them. Returns the PIDs killed.
+    """
+    live = {os.path.realpath(path) for path in live_dirs if path}
+    killed = []
+    for pid in _all_pids():
+        arguments = _proc_cmdline(pid)
+        if any(argument.startswith("--type=") for argument in arguments):
+            continue
+        profile = next((a.split("=", 1)[1] for a in arguments if a.startswith("--user-data-dir=")), None)
+        if not profile or not os.path.basename(profile).startswith("chrome_user_data_"):
+            continue
+        if os.path.realpath(profile) in live:
+            continue
+        status = _proc_status(pid) or {}
+        parent = _proc_status(int(status.get("PPid", "0"))) or {}
+        if "chromedriver" in parent.get("Name", ""):
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed.append(pid)
+        except OSError:
+            pass
+    return killed
+
+
+class ProfileTemplate:
+    """
+    Prepared Chrome profile cloned for each session instead of an empty --user-data-dir.
+
+    The template is built once (Chrome's first-run state plus a warmed HTTP cache
+    from one visit to the storefront) and then copied into ``session_root``, which
+    defaults to RAM-backed /dev/shm so the copy is cheap. Every session gets its
+    own copy of the warmed cache: Chrome's disk cache cannot be shared by several
+    running browsers.
+    """
+
+    def __init__(self, template_dir, session_root=None):
+        self.template_dir = template_dir
+        self.session_root = session_root or default_profile_root()
+        self._lock = threading.Lock()
+
+    def is_built(self):
+        return os.path.isdir(self.template_dir) and bool(os.listdir(self.template_dir))
+
+    def ensure_built(self, builder):
+        """Build the template with ``builder(template_dir)`` unless it already exists"""
+        with self._lock:
+            if self.is_built():
+                return
+            print(f"Building Chrome profile template in {self.template_dir}")
+            os.makedirs(self.template_dir, exist_ok=True)
+            try:
+                builder(self.template_dir)
+            except Exception:
+                shutil.rmtree(self.template_dir, ignore_errors=True)
+                raise
+            for name in PROFILE_LOCK_FILES:
+                lock_path = os.path.join(self.template_dir, name)
+                if os.path.lexists(lock_path):
+                    os.remove(lock_path)
+
+    def clone(self):
+        """Copy the template into a fresh session profile directory and return its path"""
+        os.makedirs(self.session_root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix="chrome_user_data_", dir=self.session_root)
+        shutil.copytree(self.template_dir, path, dirs_exist_ok=True, symlinks=True, ignore=self._ignore)
+        return path
+
+    def _ignore(self, directory, names):
+        return {name for name in names if name in PROFILE_LOCK_FILES}
+
+
+_profile_template = None
+_profile_template_lock = threading.Lock()
+
+
+def shared_profile_template():
+    """Return the ProfileTemplate configured by KIGOAUTO_PROFILE_TEMPLATE, or None"""
+    global _profile_template
+    template_dir = os.environ.get("KIGOAUTO_PROFILE_TEMPLATE")
+    if not template_dir:
+        return None
+    with _profile_template_lock:
+        if _profile_template is None:
+            _profile_template = ProfileTemplate(template_dir)
+        return _profile_template
+
+
+# Request patterns dropped in blocking mode (CDP Network.setBlockedURLs wildcards)
+BLOCKED_ASSET_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m4a",
+]
+BLOCKED_TRACKER_PATTERNS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*googleadservices.com*", "*adservice.google.*",
+    "*connect.facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*clarity.ms*",
+    "*bat.bing.com*", "*analytics.tiktok.com*", "*static.ads-twitter.com*", "*criteo.*",
+]
+
+# Bytes transferred by the page and its resources, from the Resource Timing API
+PAGE_BYTES_SCRIPT = """
+var total = 0, count = 0;
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+for (var i = 0; i < entries.length; i++) {
+    total += entries[i].transferSize || 0;
+    count += 1;
+}
+return [total, count];
+"""
+
+
+class ResourceStats:
+    """
+    Bytes transferred per page kind, with and without resource blocking.
+
+    Loads without blocking set a per-kind baseline (moving average); loads with
+    blocking count the difference from that baseline as bytes saved. Operations
+    that always block never load a page unblocked on their own, so
+    ``sample_due`` asks for the first run of each operation, and every
+    ``sample_every``-th after that, to go unblocked and refresh the baseline.
+    """
+
+    def __init__(self, sample_every=20):
+        self.sample_every = sample_every
+        self._lock = threading.Lock()
+        self.pages = {}
+        self._blocked_runs = {}
+
+    def sample_due(self, operation):
+        """Whether this run of a blocking ``operation`` should load its pages unblocked instead"""
+        if not self.sample_every:
+            return False
+        with self._lock:
+            runs = self._blocked_runs.get(operation)
+            if runs is not None and runs < self.sample_every:
+                self._blocked_runs[operation] = runs + 1
+                return False
+            self._blocked_runs[operation] = 1
+            return True
+
+    def record(self, kind, transferred, resources, blocked):
+        with self._lock:
+            entry = self.pages.setdefault(kind, {
+                "loads": 0, "blocked_loads": 0, "transferred_bytes": 0,
+                "baseline_bytes": None, "bytes_saved": 0, "last_bytes_saved": None,
+            })
+            entry["loads"] += 1
+            entry["transferred_bytes"] += transferred
+            entry["last_resources"] = resources
+            if blocked:
+                entry["blocked_loads"] += 1
+                if entry["baseline_bytes"] is not None:
+                    saved = max(0, int(entry["baseline_bytes"] - transferred))
+                    entry["bytes_saved"] += saved
+                    entry["last_bytes_saved"] = saved
+                    return saved
+            else:
+                baseline = entry["baseline_bytes"]
+                entry["baseline_bytes"] = transferred if baseline is None else 0.8 * baseline + 0.2 * transferred
+            return None
+
+    def report(self):
+        with self._lock:
+            return {kind: dict(entry) for kind, entry in self.pages.items()}
+
+
+resource_stats = ResourceStats(sample_every=int(os.environ.get("KIGOAUTO_BLOCK_SAMPLE_EVERY", "20")))
+
+
+class ResourceBlocker:
+    """
+    Drop images, fonts, media and analytics/ad requests for one driver.
+
+    Uses CDP ``Network.setBlockedURLs`` so blocking can be switched per operation
+    (the login flow may need challenge scripts and images, product pages do not).
+    On drivers without CDP support every call is a no-op.
+    """
+
+    def __init__(self, driver, patterns=None, stats=None):
+        self.driver = driver
+        self.patterns = list(patterns) if patterns is not None else BLOCKED_ASSET_PATTERNS + BLOCKED_TRACKER_PATTERNS
+        self.stats = stats or resource_stats
+        self.enabled = False
+        self._network_enabled = False
+        self.supported = hasattr(driver, "execute_cdp_cmd")
+
+    def set_enabled(self, enabled):
+        if not self.supported or enabled == self.enabled:
+            return
+        try:
+            if not self._network_enabled:
+                self.driver.execute_cdp_cmd("Network.enable", {})
+                self._network_enabled = True
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.patterns if enabled else []})
+            self.enabled = enabled
+        except Exception as e:
+            print(f"Warning: Could not {'enable' if enabled else 'disable'} resource blocking: {e}")
+            self.supported = False
+
+    def record_page(self, kind):
+        """Record the bytes the current page transferred; returns the bytes saved by blocking, if known"""
+        try:
+            transferred, resources = self.driver.execute_script(PAGE_BYTES_SCRIPT)
+        except Exception:
+            return None
+        saved = self.stats.record(kind, int(transferred), int(resources), self.enabled)
+        if saved is not None:
+            print(f"Resource blocking saved ~{saved / 1024:.0f} KiB on {kind} page")
+        return saved
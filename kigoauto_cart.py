@@ -0,0 +1,186 @@
+import re
+import threading
+import time
+
+from lxml import html as lxml_html
+
+# Cart markup varies between the storefront's themes; each field is looked up by
+# the first class name that matches, in this order
+ITEM_CLASSES = ("cart-item", "cart_item", "cart-row", "cart-line")
+FIELD_CLASSES = {
+    "sku": ("sku", "product-sku", "item-sku"),
+    "name": ("name", "product-name", "item-name", "title"),
+    "quantity": ("qty", "quantity", "item-qty", "qty_num"),
+    "price": ("price", "unit-price", "item-price"),
+    "line_total": ("line-total", "row-total", "subtotal", "item-total"),
+}
+COUNT_CLASSES = ("cart-count", "cart-item-count", "cart-qty")
+TOTAL_CLASSES = ("cart-total", "grand-total", "total-price", "order-total")
+
+MONEY_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+CURRENCY_PATTERN = re.compile(r"[$€£¥₩]|[A-Z]{3}(?=\s*-?\d)")
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def parse_money(text):
+    """Turn "$1,234.50" into 1234.5; None when there is no number"""
+    match = MONEY_PATTERN.search(text or "")
+    if not match:
+        return None
+    return float(match.group().replace(",", ""))
+
+
+def parse_quantity(text):
+    value = parse_money(text)
+    return int(value) if value is not None else None
+
+
+def _text(element):
+    return " ".join(element.text_content().split())
+
+
+def _field(row, names):
+    """Text of the first descendant of ``row`` carrying one of the class ``names``"""
+    for name in names:
+        for element in row.xpath(f".//*[{_has_class(name)}]"):
+            if element.tag in ("input", "select", "textarea"):
+                return element.get("value", "")
+            text = _text(element)
+            if text:
+                return text
+    return None
+
+
+def _first_text(doc, names, attribute=None):
+    for name in names:
+        for element in doc.xpath(f"//*[{_has_class(name)}]"):
+            text = _text(element)
+            if text:
+                return text
+    if attribute:
+        for element in doc.xpath(f"//*[@{attribute}]"):
+            return element.get(attribute)
+    return None
+
+
+def _cart_rows(doc):
+    for name in ITEM_CLASSES:
+        rows = doc.xpath(f"//*[{_has_class(name)}]")
+        if rows:
+            return rows
+    # Rows only marked by their SKU; skip elements nested in another marked row
+    return doc.xpath("//*[@data-sku][not(ancestor::*[@data-sku])]")
+
+
+def parse_cart(page_html):
+    """
+    Read the line items and totals from a cart page.
+
+    Returns ``{"items": [...], "item_count": int, "total": float, "currency": str}``
+    where every item has ``sku``, ``name``, ``quantity``, ``price`` and
+    ``line_total`` (None for whatever the page does not show). ``item_count`` is
+    the cart badge when there is one, the sum of quantities otherwise; ``total``
+    falls back to the sum of line totals.
+    """
+    doc = lxml_html.fromstring(page_html)
+    items = []
+    currency = None
+    for row in _cart_rows(doc):
+        quantity_input = row.xpath(".//input[contains(translate(@name, 'QTY', 'qty'), 'qty') "
+                                   "or contains(@name, 'quantity')]")
+        quantity = parse_quantity(quantity_input[0].get("value") if quantity_input
+                                  else _field(row, FIELD_CLASSES["quantity"]))
+        price_text = _field(row, FIELD_CLASSES["price"])
+        line_total = parse_money(_field(row, FIELD_CLASSES["line_total"]))
+        price = parse_money(price_text)
+        if line_total is None and price is not None and quantity is not None:
+            line_total = round(price * quantity, 2)
+        if currency is None and price_text:
+            match = CURRENCY_PATTERN.search(price_text)
+            currency = match.group() if match else None
+        items.append({
+            "sku": row.get("data-sku") or row.get("data-product-id") or _field(row, FIELD_CLASSES["sku"]),
+            "name": _field(row, FIELD_CLASSES["name"]),
+            "quantity": quantity,
+            "price": price,
+            "line_total": line_total,
+        })
+
+    count_text = _first_text(doc, COUNT_CLASSES, attribute="data-cart-count")
+    item_count = parse_quantity(count_text)
+    if item_count is None:
+        item_count = sum(item["quantity"] or 0 for item in items)
+
+    total_text = _first_text(doc, TOTAL_CLASSES, attribute="data-cart-total")
+    total = parse_money(total_text)
+    if total is None and items:
+        total = round(sum(item["line_total"] or 0 for item in items), 2)
+    if currency is None and total_text:
+        match = CURRENCY_PATTERN.search(total_text)
+        currency = match.group() if match else None
+
+    return {
+        "items": items,
+        "item_count": item_count,
+        "total": total,
+        "currency": currency,
+    }
+
+
+class CartCache:
+    """
+    Recently read carts per session, so frequent /cart-status polls skip the storefront.
+
+    Entries live ``ttl`` seconds. ``invalidate`` drops a session's entry after an
+    add-to-cart and bumps its generation, so a read that started before the add
+    cannot put the old cart back (``put`` takes the generation seen by ``begin``).
+    """
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}
+
+    def get(self, key):
+        """Return (cart, age in seconds) or None when nothing fresh is cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cart, stored_at = entry
+            age = time.time() - stored_at
+            if age > self.ttl:
+                del self._entries[key]
+                return None
+            return cart, age
+
+    def begin(self, key):
+        """Generation to hand to ``put`` once the cart read started now has finished"""
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def put(self, key, cart, generation):
+        if not self.ttl:
+            return
+        now = time.time()
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return
+            self._entries[key] = (cart, now)
+            for stale in [k for k, (_, stored_at) in self._entries.items() if now - stored_at > self.ttl]:
+                del self._entries[stale]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def discard(self, key):
+        """Forget a session entirely, e.g. when it is closed"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations.pop(key, None)
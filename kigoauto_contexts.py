@@ -0,0 +1,273 @@
+import threading
+import time
+
+from selenium.common import WebDriverException
+
+from kigoauto_automation import KigoAutoLogin
+from kigoauto_browser import ResourceBlocker
+from kigoauto_metrics import metrics
+
+BROWSER_BACKENDS = ("process", "contexts")
+
+
+class SharedChrome:
+    """
+    One Chrome process hosting many sessions, each in its own CDP browser context.
+
+    A browser context (``Target.createBrowserContext``) is Chrome's incognito
+    profile: its own cookies, storage and cache, but the browser, GPU and
+    network processes are shared. Every context gets one page target, which
+    ChromeDriver exposes as a window. A WebDriver session has a single current
+    window, so all contexts of one Chrome share ``lock`` and switch to their
+    window when they take it (see ``ContextLock``). If Chrome dies it is
+    relaunched on the next context request; ``generation`` tells the sessions
+    of the old Chrome to reopen their context.
+    """
+
+    def __init__(self, headless=True, factory=None, name="shared-chrome"):
+        self.headless = headless
+        self.factory = factory or (lambda: KigoAutoLogin(headless=self.headless, humanize="fast"))
+        self.name = name
+        self.lock = threading.RLock()
+        self.host = None
+        self.base_handle = None
+        self.current_handle = None
+        self.generation = 0
+        self.contexts = 0
+        self.opened = 0
+        self.relaunches = 0
+
+    @property
+    def driver(self):
+        return self.host.driver if self.host is not None else None
+
+    def open_context(self):
+        """Create a browser context with one blank page; returns (driver, context_id, window_handle, generation)"""
+        with self.lock:
+            try:
+                return self._open_context()
+            except WebDriverException as e:
+                if self.host is None:
+                    raise
+                print(f"{self.name} did not open a browser context ({e}), relaunching Chrome")
+                self.relaunch()
+                return self._open_context()
+
+    def _open_context(self):
+        if self.driver is None:
+            self.relaunch()
+        driver = self.driver
+        context_id = driver.execute_cdp_cmd("Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+        target_id = driver.execute_cdp_cmd(
+            "Target.createTarget", {"url": "about:blank", "browserContextId": context_id}
+        )["targetId"]
+        # ChromeDriver uses the DevTools target id as the window handle
+        self.switch(target_id)
+        self.contexts += 1
+        self.opened += 1
+        return driver, context_id, target_id, self.generation
+
+    def close_context(self, context_id, generation):
+        """Dispose of a context and its pages; a no-op for contexts of a Chrome since replaced"""
+        with self.lock:
+            self.contexts = max(0, self.contexts - 1)
+            if generation != self.generation or self.driver is None:
+                return
+            try:
+                self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context_id})
+                self.switch(self.base_handle, force=True)
+            except WebDriverException as e:
+                print(f"Warning: Could not dispose browser context {context_id}: {e}")
+
+    def switch(self, handle, force=False):
+        """Make ``handle`` the current window of the shared WebDriver session (hold ``lock``)"""
+        if handle is None or (handle == self.current_handle and not force):
+            return
+        self.current_handle = None
+        self.driver.switch_to.window(handle)
+        self.current_handle = handle
+
+    def relaunch(self):
+        """Close the current Chrome, if any, and launch a new one (hold ``lock``)"""
+        if self.host is not None:
+            self.host.close()
+            self.relaunches += 1
+        self.host = None
+        self.current_handle = None
+        self.generation += 1
+        self.host = self.factory()
+        self.base_handle = self.current_handle = self.host.driver.current_window_handle
+        print(f"{self.name} launched (generation {self.generation})")
+
+    def health(self, ping_timeout=5):
+        if self.host is None:
+            return {"alive": False, "error": "not launched", "rss_bytes": None, "page_loads": 0, "age": None}
+        return self.host.health(ping_timeout)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "running": self.driver is not None,
+            "contexts": self.contexts,
+            "opened": self.opened,
+            "relaunches": self.relaunches,
+            "generation": self.generation,
+        }
+
+    def close(self):
+        with self.lock:
+            if self.host is not None:
+                self.host.close()
+                self.host = None
+            self.current_handle = None
+
+
+class SharedChromeGroup:
+    """
+    A few SharedChrome processes; new contexts go to the one hosting the fewest.
+
+    Sessions of one Chrome take turns (one WebDriver command sequence at a
+    time), so more than one Chrome lets logins run side by side.
+    """
+
+    def __init__(self, browsers=1, headless=True, factory=None):
+        self.chromes = [SharedChrome(headless=headless, factory=factory, name=f"shared-chrome-{index}")
+                        for index in range(max(1, browsers))]
+        self._lock = threading.Lock()
+
+    def pick(self):
+        with self._lock:
+            return min(self.chromes, key=lambda chrome: chrome.contexts)
+
+    def session(self, **kwargs):
+        """A new ContextSession on the least loaded Chrome (DriverPool factory)"""
+        return ContextSession(self.pick(), **kwargs)
+
+    def stats(self):
+        return [chrome.stats() for chrome in self.chromes]
+
+    def close(self):
+        for chrome in self.chromes:
+            chrome.close()
+
+
+class ContextLock:
+    """
+    The shared Chrome's lock, seen from one session: taking it also makes the
+    session's window current, reopening the session's context first if Chrome
+    was relaunched or the window is gone. Supports the ``threading.RLock``
+    calls the API and supervisor use (``with``, ``acquire``, ``release``).
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self.session.shared.lock.acquire(blocking, timeout):
+            return False
+        try:
+            self.session.attach()
+        except Exception as e:
+            # Leave it detached: its commands fail and the supervisor relaunches it
+            print(f"Warning: Could not switch to the session's browser context: {e}")
+            self.session.driver = None
+        return True
+
+    def release(self):
+        self.session.shared.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ContextSession(KigoAutoLogin):
+    """
+    A KigoAutoLogin living in a browser context of a SharedChrome.
+
+    ``login``, ``add_products``, ``get_cookies`` and the rest work as with a
+    browser of its own; ``install`` opens a context instead of launching Chrome
+    and ``close`` disposes of it. ``lock`` is a ContextLock, so holding it also
+    selects this session's window; ``close_lock`` is the shared Chrome's plain lock.
+    """
+
+    def __init__(self, shared, **kwargs):
+        self.shared = shared
+        self.context_id = None
+        self.window_handle = None
+        self.generation = None
+        # Last cookie jar read from the context, to carry the login over when the context is reopened
+        self.known_cookies = []
+        super().__init__(headless=shared.headless, **kwargs)
+        self.lock = ContextLock(self)
+        # Disposing of the context needs no window, so closing skips the attach (and the
+        # reopening of a context from a replaced Chrome) that taking ``lock`` would do
+        self.close_lock = shared.lock
+
+    def install(self, headless=False):
+        install_started = time.time()
+        self.user_data_dir = None
+        self.driver, self.context_id, self.window_handle, self.generation = self.shared.open_context()
+        # Network.* commands reach the current window's target, i.e. only this context's page
+        self.blocker = ResourceBlocker(self.driver)
+        self.launched_at = time.time()
+        self.page_loads = 0
+        self.fresh = True
+        metrics.observe("kigoauto_driver_install_seconds", self.launched_at - install_started,
+                        outcome="ok", backend="contexts")
+
+    def attach(self):
+        """Make this session's window current (hold the shared lock)"""
+        if self.window_handle is None:
+            return
+        if self.generation == self.shared.generation and self.driver is not None:
+            try:
+                self.shared.switch(self.window_handle)
+                return
+            except WebDriverException as e:
+                print(f"Browser context window of {self.context_id} is gone ({e}), reopening it")
+        self.recover(cookies=list(self.known_cookies or self.pending_cookies))
+
+    def get_cookies(self):
+        cookies = super().get_cookies()
+        if cookies:
+            self.known_cookies = cookies
+        return cookies
+
+    def health(self, ping_timeout=5):
+        """Like ``KigoAutoLogin.health`` for this context; memory is reported for the whole Chrome only"""
+        if not self.lock.acquire(timeout=ping_timeout):
+            # Another session is driving this Chrome, so it answers
+            return {"alive": True, "page_loads": self.page_loads,
+                    "age": round(time.time() - self.launched_at, 1), "rss_bytes": None}
+        try:
+            report = super().health(ping_timeout)
+        finally:
+            self.lock.release()
+        report["rss_bytes"] = None
+        return report
+
+    def recover(self, cookies=None):
+        if cookies is None and self.generation != self.shared.generation:
+            # The old Chrome is gone; its cookies only survive in our last copy
+            cookies = list(self.known_cookies or self.pending_cookies)
+        super().recover(cookies)
+
+    def close(self):
+        """Dispose of the browser context; the shared Chrome keeps running"""
+        try:
+            if self.http is not None:
+                self.http.close()
+                self.http = None
+            if self.context_id is not None:
+                context_id, generation = self.context_id, self.generation
+                self.context_id = None
+                self.window_handle = None
+                self.driver = None
+                self.shared.close_context(context_id, generation)
+            self.fresh = False
+        except Exception as e:
+            print(f"Warning: Could not cleanup properly: {e}")
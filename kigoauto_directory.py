@@ -0,0 +1,144 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# What a worker can own: a session (by session_id), an account's session (by
+# email) and a queued job (by job_id)
+OWNER_KINDS = ("session", "account", "job")
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SessionDirectory:
+    """
+    Which worker process owns which session, account and job, shared in SQLite.
+
+    Every worker registers the internal address other workers can forward
+    requests to with ``heartbeat`` and keeps calling it; a worker whose last
+    heartbeat is older than ``stale_after`` seconds counts as gone, and its
+    entries are ignored and then purged. Like ``SessionStore``, the database runs in WAL mode with one
+    connection per thread, so all workers of a node can share the file.
+    """
+
+    def __init__(self, path="kigoauto_sessions.db", stale_after=30):
+        self.path = path
+        self.stale_after = stale_after
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                " worker_id TEXT PRIMARY KEY,"
+                " address TEXT NOT NULL,"
+                " pid INTEGER NOT NULL,"
+                " started_at REAL NOT NULL,"
+                " heartbeat_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS owners ("
+                " kind TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " worker_id TEXT NOT NULL,"
+                " claimed_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, key))"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def heartbeat(self, worker_id, address):
+        """
+        Register the worker (or refresh its heartbeat) and purge workers, with
+        their entries, that stopped beating.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO workers (worker_id, address, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (worker_id) DO UPDATE SET address = excluded.address, heartbeat_at = excluded.heartbeat_at",
+                (worker_id, address, os.getpid(), now, now),
+            )
+            conn.execute(
+                "DELETE FROM owners WHERE worker_id IN"
+                " (SELECT worker_id FROM workers WHERE heartbeat_at <= ?)",
+                (now - self.stale_after,),
+            )
+            conn.execute("DELETE FROM workers WHERE heartbeat_at <= ?", (now - self.stale_after,))
+
+    def unregister_worker(self, worker_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM owners WHERE worker_id = ?", (worker_id,))
+            conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def workers(self):
+        """Live workers as dicts"""
+        rows = self._connect().execute(
+            "SELECT worker_id, address, pid, started_at, heartbeat_at FROM workers WHERE heartbeat_at > ?",
+            (time.time() - self.stale_after,),
+        ).fetchall()
+        return [
+            {"worker_id": worker_id, "address": address, "pid": pid,
+             "started_at": started_at, "heartbeat_at": heartbeat_at}
+            for worker_id, address, pid, started_at, heartbeat_at in rows
+        ]
+
+    def claim(self, kind, key, worker_id):
+        """Record ``worker_id`` as the owner of ``key``, taking it over from any other worker"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO owners (kind, key, worker_id, claimed_at) VALUES (?, ?, ?, ?)",
+                (kind, key, worker_id, time.time()),
+            )
+
+    def release(self, kind, key, worker_id):
+        """Drop the entry if ``worker_id`` still owns it"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM owners WHERE kind = ? AND key = ? AND worker_id = ?", (kind, key, worker_id))
+
+    def sync(self, worker_id, kind, keys):
+        """Make the worker's entries of ``kind`` exactly ``keys`` (without moving anything it lost)"""
+        keys = set(keys)
+        with self._connect() as conn:
+            owned = {key for (key,) in conn.execute(
+                "SELECT key FROM owners WHERE kind = ? AND worker_id = ?", (kind, worker_id))}
+            stale = owned - keys
+            conn.executemany("DELETE FROM owners WHERE kind = ? AND key = ? AND worker_id = ?",
+                             [(kind, key, worker_id) for key in stale])
+            now = time.time()
+            conn.executemany("INSERT OR IGNORE INTO owners (kind, key, worker_id, claimed_at) VALUES (?, ?, ?, ?)",
+                             [(kind, key, worker_id, now) for key in keys - owned])
+
+    def owner(self, kind, key):
+        """(worker_id, address) of the live worker owning ``key``, or None"""
+        return self._connect().execute(
+            "SELECT w.worker_id, w.address FROM owners o JOIN workers w ON w.worker_id = o.worker_id"
+            " WHERE o.kind = ? AND o.key = ? AND w.heartbeat_at > ?",
+            (kind, key, time.time() - self.stale_after),
+        ).fetchone()
+
+    def latest(self, kind):
+        """(key, worker_id, address) of the most recently claimed entry of ``kind`` on a live worker"""
+        return self._connect().execute(
+            "SELECT o.key, w.worker_id, w.address FROM owners o JOIN workers w ON w.worker_id = o.worker_id"
+            " WHERE o.kind = ? AND w.heartbeat_at > ? ORDER BY o.claimed_at DESC LIMIT 1",
+            (kind, time.time() - self.stale_after),
+        ).fetchone()
+
+    def counts(self):
+        """Entries per worker and kind, for /pool-status"""
+        rows = self._connect().execute(
+            "SELECT worker_id, kind, COUNT(*) FROM owners GROUP BY worker_id, kind"
+        ).fetchall()
+        counts = {}
+        for worker_id, kind, count in rows:
+            counts.setdefault(worker_id, {})[kind] = count
+        return counts
@@ -0,0 +1,170 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StepCancelled(Exception):
+    """The caller cancelled the operation; raised at the start of the next step"""
+
+
+class StepObserver:
+    """
+    Collects the step events of whatever automation runs in its context.
+
+    Set it with ``observe`` around a call (a queued job, a request handler) and
+    every KigoAutoLogin operation running on its behalf, including on executor
+    threads, reports here. ``cancel`` makes that automation stop at its next step.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.events = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def __call__(self, event):
+        with self._lock:
+            self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def since(self, index):
+        """Events recorded after the first ``index`` ones"""
+        with self._lock:
+            return self.events[index:]
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+current_observer = contextvars.ContextVar("kigoauto_step_observer", default=None)
+
+
+@contextmanager
+def observe(observer):
+    """Report step events from automation called inside the ``with`` block to ``observer``"""
+    token = current_observer.set(observer)
+    try:
+        yield observer
+    finally:
+        current_observer.reset(token)
+
+
+class StepEvents:
+    """
+    Step event hub of one KigoAutoLogin.
+
+    Events go to the subscribed listeners and to the StepObserver of the calling
+    context. Each event is a dict with the operation, the step name, its outcome
+    ("ok", "error", "cancelled" for steps; "success", "fail", "error", "cancelled"
+    for the operation itself), its duration in seconds and optional details.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.listeners = []
+
+    def subscribe(self, listener):
+        with self._lock:
+            self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def emit(self, event):
+        with self._lock:
+            listeners = list(self.listeners)
+        observer = current_observer.get()
+        if observer is not None:
+            listeners.append(observer)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Warning: Step event listener failed: {e}")
+
+    def cancelled(self):
+        observer = current_observer.get()
+        return observer is not None and observer.cancelled
+
+    def operation(self, name, **detail):
+        return Operation(self, name, detail)
+
+
+class Operation:
+    """
+    One login or add-to-cart, reported as a sequence of named steps.
+
+    ``step`` closes the current step as "ok" and opens the next one, raising
+    StepCancelled first if the caller cancelled. ``finish`` and ``fail`` close
+    the last step and report the operation's outcome.
+    """
+
+    def __init__(self, events, name, detail=None):
+        self.events = events
+        self.name = name
+        self.detail = dict(detail or {})
+        self.started = time.time()
+        self.current = None
+        self.current_started = None
+        self.current_detail = {}
+        self.done = False
+
+    def step(self, name, **detail):
+        self._end_step("ok")
+        if self.events.cancelled():
+            raise StepCancelled(f"{self.name} cancelled before '{name}'")
+        self.current = name
+        self.current_started = time.time()
+        self.current_detail = detail
+
+    def note(self, **detail):
+        """Attach details (e.g. the selector that matched) to the current step"""
+        self.current_detail.update(detail)
+
+    def record(self, name, started, outcome="ok", **detail):
+        """Report a step that ran outside the sequence, e.g. one item of a parallel batch"""
+        self.events.emit(self._event("step", name, outcome, time.time() - started, detail))
+
+    def finish(self, success=True, **detail):
+        self._end_step("ok")
+        self._end_operation("success" if success else "fail", detail)
+
+    def fail(self, error):
+        outcome = "cancelled" if isinstance(error, StepCancelled) else "error"
+        self._end_step(outcome, error=str(error))
+        self._end_operation(outcome, {"error": str(error)})
+
+    def _end_step(self, outcome, **detail):
+        if self.current is None:
+            return
+        detail = dict(self.current_detail, **detail)
+        self.events.emit(self._event("step", self.current, outcome, time.time() - self.current_started, detail))
+        self.current = None
+
+    def _end_operation(self, outcome, detail):
+        if self.done:
+            return
+        self.done = True
+        self.events.emit(self._event("operation", self.name, outcome, time.time() - self.started,
+                                     dict(self.detail, **detail)))
+
+    def _event(self, kind, step, outcome, seconds, detail):
+        event = {
+            "type": kind,
+            "operation": self.name,
+            "step": step,
+            "outcome": outcome,
+            "seconds": round(seconds, 3),
+            "at": time.time(),
+        }
+        if detail:
+            event["detail"] = detail
+        return event
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BrowserExecutor:
+    """
+    Run blocking Selenium work on a bounded thread pool.
+
+    FastAPI handlers await ``run``/``with_driver`` instead of calling KigoAutoLogin
+    methods directly, so a slow login no longer freezes the event loop. Calls made
+    through ``with_driver`` hold the driver's lock, because a WebDriver session can
+    only execute one command sequence at a time.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="browser")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` on the browser thread pool and await its result"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._queued += 1
+        # Carry the caller's context (e.g. its step observer) into the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._call, func, args, kwargs)
+        return await loop.run_in_executor(self._pool, call)
+
+    async def with_driver(self, kigo, func, *args, **kwargs):
+        """Run ``func`` on the thread pool while holding ``kigo``'s lock"""
+        return await self.run(self._call_locked, kigo, func, *args, **kwargs)
+
+    def stats(self):
+        """Return the number of running and waiting browser tasks"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _call(self, func, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    @staticmethod
+    def _call_locked(kigo, func, *args, **kwargs):
+        with kigo.lock:
+            return func(*args, **kwargs)
@@ -0,0 +1,115 @@
+from selenium.webdriver.common.keys import Keys
+
+from kigoauto_metrics import metrics
+
+FILL_STRATEGIES = ("keys", "cdp", "js", "human")
+
+# Sets the value through the native setter (so frameworks tracking the value see
+# it change), fires the events a user edit would, and reads the value back
+SET_VALUE_SCRIPT = """
+var el = arguments[0], value = arguments[1];
+var proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+var setter = Object.getOwnPropertyDescriptor(proto, 'value').set;
+el.focus();
+setter.call(el, value);
+el.dispatchEvent(new Event('input', {bubbles: true}));
+el.dispatchEvent(new Event('change', {bubbles: true}));
+return el.value;
+"""
+
+# Focuses the field and selects its content, so inserted text replaces it
+SELECT_SCRIPT = """
+var el = arguments[0];
+el.focus();
+el.select();
+return document.activeElement === el;
+"""
+
+
+def parse_fill_spec(spec, default="keys"):
+    """
+    Parse "keys,quantity=js" into ("keys", {"quantity": "js"}): a bare name sets
+    the default strategy, ``field=strategy`` overrides it for one field.
+    """
+    fields = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        field, _, strategy = item.rpartition("=")
+        if strategy not in FILL_STRATEGIES:
+            raise ValueError(f"Unknown fill strategy '{strategy}', expected one of {FILL_STRATEGIES}")
+        if field:
+            fields[field.strip()] = strategy
+        else:
+            default = strategy
+    return default, fields
+
+
+class FieldFiller:
+    """
+    How text gets into a form field, chosen per field ("email", "password", "quantity").
+
+    - ``keys``: one ``send_keys`` call that selects the old content and types over it
+    - ``cdp``: select the content with a script, then one CDP ``Input.insertText``
+    - ``js``: set the value with a script and fire input/change events
+    - ``human``: one keystroke at a time with the humanization policy's typing pauses
+
+    ``cdp`` and ``js`` fall back to ``keys`` when they are unavailable or the
+    value does not stick.
+    """
+
+    def __init__(self, default="keys", fields=None, policy=None):
+        self.default = default
+        self.fields = dict(fields or {})
+        self.policy = policy
+        for strategy in [default] + list(self.fields.values()):
+            if strategy not in FILL_STRATEGIES:
+                raise ValueError(f"Unknown fill strategy '{strategy}', expected one of {FILL_STRATEGIES}")
+
+    @classmethod
+    def from_spec(cls, spec, policy=None):
+        default, fields = parse_fill_spec(spec)
+        return cls(default, fields, policy)
+
+    def strategy_for(self, field):
+        return self.fields.get(field, self.default)
+
+    def fill(self, driver, element, text, field=None):
+        """Put ``text`` into ``element``; returns the strategy that did it"""
+        strategy = self.strategy_for(field)
+        with metrics.span("kigoauto_fill_seconds", strategy=strategy, field=field):
+            try:
+                getattr(self, f"_fill_{strategy}")(driver, element, text)
+                return strategy
+            except Exception as e:
+                if strategy == "keys" or strategy == "human":
+                    raise
+                print(f"Fill strategy '{strategy}' failed for {field or 'field'} ({e}), typing instead")
+        self._fill_keys(driver, element, text)
+        return "keys"
+
+    def _fill_keys(self, driver, element, text):
+        # Select-all then type replaces any old content in the same command
+        element.send_keys(Keys.CONTROL, "a", Keys.NULL, text)
+
+    def _fill_cdp(self, driver, element, text):
+        if not hasattr(driver, "execute_cdp_cmd"):
+            raise RuntimeError("driver has no CDP support")
+        if not driver.execute_script(SELECT_SCRIPT, element):
+            raise RuntimeError("could not focus the field")
+        driver.execute_cdp_cmd("Input.insertText", {"text": text})
+
+    def _fill_js(self, driver, element, text):
+        value = driver.execute_script(SET_VALUE_SCRIPT, element, text)
+        if value != text:
+            raise ValueError(f"field holds {value!r} after setting it")
+
+    def _fill_human(self, driver, element, text):
+        element.clear()
+        if self.policy is None or self.policy.typing_delay[1] <= 0:
+            element.send_keys(text)
+            return
+        for char in text:
+            element.send_keys(char)
+            self.policy.keystroke_pause()
@@ -0,0 +1,196 @@
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+
+from kigoauto_cart import parse_cart
+from kigoauto_network import cart_count_from_body
+from kigoauto_verify import AUTH_COOKIE_NAMES, LOGOUT_HREF_MARKERS
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Markers of Cloudflare-style interstitials that only a real browser can get past
+CHALLENGE_MARKERS = [
+    "cf-chl",
+    "cf_chl_opt",
+    "challenge-platform",
+    "just a moment...",
+    "checking your browser",
+    "cf-turnstile",
+]
+
+
+class ChallengeDetected(Exception):
+    """The storefront answered with something only a real browser can handle"""
+
+
+class CartHttpClient:
+    """
+    Replay storefront forms over a pooled requests.Session seeded with browser cookies.
+
+    This is the browserless fast path for add-to-cart: the product page is fetched
+    over HTTP, its add-to-cart form is parsed and posted back with ``Qty`` set.
+    ``ChallengeDetected`` is raised whenever the response looks like a bot check or
+    a lost login, so the caller can fall back to Selenium.
+    """
+
+    def __init__(self, cookies=None, user_agent=DEFAULT_USER_AGENT, pool_size=10, timeout=15):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+        })
+        if cookies:
+            self.load_cookies(cookies)
+
+    def load_cookies(self, cookies):
+        """Copy Selenium-style cookie dicts into the session's cookie jar"""
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+            )
+
+    def get_cookies(self):
+        """Return the cookie jar as Selenium-style cookie dicts"""
+        cookies = []
+        for cookie in self.session.cookies:
+            entry = {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+            }
+            if cookie.expires:
+                entry["expiry"] = cookie.expires
+            cookies.append(entry)
+        return cookies
+
+    def get(self, url, **kwargs):
+        """GET ``url`` and raise ChallengeDetected if the response is a challenge"""
+        response = self.session.get(url, timeout=self.timeout, **kwargs)
+        self.check_response(response)
+        response.raise_for_status()
+        return response
+
+    def is_logged_in(self, account_url, auth_cookies=AUTH_COOKIE_NAMES):
+        """
+        Cheap validity probe of the account page. The page must not bounce to the
+        login page or show a sign-in form, and must show that someone is logged in:
+        a logout link, or one of the ``auth_cookies`` in the jar.
+        """
+        try:
+            page = self.get(account_url)
+        except (ChallengeDetected, requests.RequestException) as e:
+            print(f"Session probe failed: {e}")
+            return False
+        doc = lxml_html.fromstring(page.text or "<html/>")
+        if doc.xpath("//input[@type='password' or translate(@name, 'EMAIL', 'email') = 'email']"):
+            print("Session probe failed: the account page shows the sign-in form")
+            return False
+        hrefs = " ".join(doc.xpath("//a/@href")).lower()
+        if any(marker in hrefs for marker in LOGOUT_HREF_MARKERS):
+            return True
+        names = {name.lower() for name in auth_cookies}
+        if any(cookie.name.lower() in names for cookie in self.session.cookies):
+            return True
+        print("Session probe failed: no logout link or authentication cookie")
+        return False
+
+    def add_to_cart(self, product_url, quantity):
+        """
+        Add ``quantity`` of a product by posting its add-to-cart form.
+
+        Returns a dict with the final URL and status code of the cart request, the
+        status of its first response (before redirects), the cart token cookie and
+        the item count the response reports, when it does.
+        """
+        page = self.get(product_url)
+        form, submit = self.find_cart_form(page.text, page.url)
+        if form is None:
+            raise ChallengeDetected("Add to cart form not found on product page")
+
+        fields = dict(form.form_values())
+        qty_name = self._quantity_field_name(form)
+        fields[qty_name] = str(quantity)
+        if submit is not None and submit.get("name"):
+            fields[submit.get("name")] = submit.get("value", "")
+
+        action = urljoin(page.url, form.get("action") or page.url)
+        method = (form.get("method") or "post").lower()
+        if method == "get":
+            response = self.session.get(action, params=fields, timeout=self.timeout,
+                                        headers={"Referer": page.url})
+        else:
+            response = self.session.post(action, data=fields, timeout=self.timeout,
+                                         headers={"Referer": page.url})
+        self.check_response(response)
+        if response.status_code >= 400:
+            raise requests.HTTPError(f"Add to cart returned HTTP {response.status_code}", response=response)
+
+        return {
+            "status_code": response.status_code,
+            "first_status": response.history[0].status_code if response.history else response.status_code,
+            "url": response.url,
+            "fields": sorted(fields),
+            "cart_token": next((cookie.value for cookie in self.session.cookies if "cart" in cookie.name.lower()), None),
+            "cart_count": cart_count_from_body(response.text, response.headers.get("Content-Type", "")),
+        }
+
+    def get_cart(self, cart_url):
+        """Fetch the cart page and return its parsed line items and totals (see ``parse_cart``)"""
+        page = self.get(cart_url)
+        cart = parse_cart(page.text)
+        cart["cart_url"] = page.url
+        return cart
+
+    def check_response(self, response):
+        """Raise ChallengeDetected if ``response`` is a bot check or a redirect to the login page"""
+        if response.status_code in (403, 429, 503) and (
+            "cf-ray" in response.headers or "cloudflare" in response.headers.get("Server", "").lower()
+        ):
+            raise ChallengeDetected(f"HTTP {response.status_code} from Cloudflare")
+
+        content_type = response.headers.get("Content-Type", "")
+        if "html" in content_type:
+            head = response.text[:20000].lower()
+            for marker in CHALLENGE_MARKERS:
+                if marker in head:
+                    raise ChallengeDetected(f"Challenge marker '{marker}' in response")
+
+        path = urlparse(response.url).path.lower()
+        if "login" in path or "signin" in path:
+            raise ChallengeDetected("Redirected to the login page, session cookies are not valid")
+
+    @staticmethod
+    def find_cart_form(page_html, base_url):
+        """Return (form, submit_button) for the add-to-cart form in ``page_html``"""
+        doc = lxml_html.fromstring(page_html, base_url=base_url)
+        for button_xpath in ("//*[@id='addtocart_button']", "//button[normalize-space(text())='ADD TO CART']"):
+            for button in doc.xpath(button_xpath):
+                forms = button.xpath("ancestor::form")
+                if forms:
+                    return forms[-1], button
+        for form in doc.forms:
+            if form.xpath(".//input[@name='Qty' or @id='quantity']"):
+                return form, None
+        return None, None
+
+    @staticmethod
+    def _quantity_field_name(form):
+        for qty in form.xpath(".//input[@id='quantity' or @name='Qty' or contains(@class, 'qty_num')]"):
+            if qty.get("name"):
+                return qty.get("name")
+        return "Qty"
+
+    def close(self):
+        self.session.close()
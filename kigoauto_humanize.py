@@ -0,0 +1,55 @@
+import os
+import random
+import time
+
+
+class HumanizationPolicy:
+    """
+    How much the automation pretends to be a person.
+
+    ``delay_scale`` multiplies every human-like pause, ``typing_delay`` is the
+    (min, max) pause between keystrokes and ``mouse_moves`` toggles moving the
+    pointer onto elements before using them. The "fast" profile turns all of it
+    off for trusted environments where bot detection is not a concern.
+    """
+
+    PROFILES = {
+        "human": {"delay_scale": 1.0, "typing_delay": (0.05, 0.2), "mouse_moves": True},
+        "light": {"delay_scale": 0.3, "typing_delay": (0.01, 0.05), "mouse_moves": True},
+        "fast": {"delay_scale": 0.0, "typing_delay": (0.0, 0.0), "mouse_moves": False},
+    }
+
+    def __init__(self, delay_scale=1.0, typing_delay=(0.05, 0.2), mouse_moves=True, name="custom"):
+        self.delay_scale = delay_scale
+        self.typing_delay = tuple(typing_delay)
+        self.mouse_moves = mouse_moves
+        self.name = name
+
+    @classmethod
+    def from_profile(cls, name, **overrides):
+        if name not in cls.PROFILES:
+            raise ValueError(f"Unknown humanization profile '{name}', expected one of {sorted(cls.PROFILES)}")
+        settings = dict(cls.PROFILES[name], **overrides)
+        return cls(name=name, **settings)
+
+    @classmethod
+    def from_env(cls):
+        """Build the policy named by KIGOAUTO_HUMANIZE (default "human")"""
+        overrides = {}
+        if os.environ.get("KIGOAUTO_HUMANIZE_DELAY_SCALE"):
+            overrides["delay_scale"] = float(os.environ["KIGOAUTO_HUMANIZE_DELAY_SCALE"])
+        if os.environ.get("KIGOAUTO_HUMANIZE_TYPING_DELAY"):
+            # "min,max" seconds between keystrokes of the "human" fill strategy
+            low, high = os.environ["KIGOAUTO_HUMANIZE_TYPING_DELAY"].split(",")
+            overrides["typing_delay"] = (float(low), float(high))
+        return cls.from_profile(os.environ.get("KIGOAUTO_HUMANIZE", "human"), **overrides)
+
+    def pause(self, min_seconds, max_seconds):
+        """Sleep for a random human-like pause, scaled by ``delay_scale``"""
+        if self.delay_scale > 0:
+            time.sleep(random.uniform(min_seconds, max_seconds) * self.delay_scale)
+
+    def keystroke_pause(self):
+        low, high = self.typing_delay
+        if high > 0:
+            time.sleep(random.uniform(low, high))
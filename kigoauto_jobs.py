@@ -0,0 +1,209 @@
+import itertools
+import threading
+import time
+import traceback
+import uuid
+
+from kigoauto_events import StepObserver, observe
+
+
+class QueueFull(Exception):
+    """The job queue is at capacity; the caller should retry later"""
+
+
+class Job:
+    """One queued automation run (a login, an add-to-cart, ...)"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, kind, func, args, kwargs, account=None, priority=0):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.account = account
+        self.priority = priority
+        self.status = Job.QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.done = threading.Event()
+        # Step events of the automation the job runs; cancelling it stops that automation early
+        self.observer = StepObserver()
+
+    @property
+    def finished(self):
+        return self.status in (Job.SUCCEEDED, Job.FAILED, Job.CANCELLED)
+
+    def to_dict(self):
+        now = time.time()
+        data = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "account": self.account,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+        }
+        if self.started_at:
+            data["run_seconds"] = round((self.finished_at or now) - self.started_at, 3)
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error:
+            data["error"] = self.error
+        data["steps"] = self.observer.since(0)
+        return data
+
+
+class JobQueue:
+    """
+    Bounded priority queue of jobs run by a fixed pool of worker threads.
+
+    Higher ``priority`` runs first, ties run in submission order. Jobs for the
+    same account never run at the same time, so one account's login and cart
+    adds stay in order while other accounts proceed. ``submit`` raises QueueFull
+    once ``max_queued`` jobs are waiting. Finished jobs are kept for
+    ``retention`` seconds so clients can poll for the result.
+    """
+
+    def __init__(self, workers=2, max_queued=100, retention=3600):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._pending = []  # (-priority, seq, job), kept sorted
+        self._jobs = {}
+        self._busy_accounts = set()
+        self._running = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            for _, _, job in self._pending:
+                self._finish(job, Job.CANCELLED, error="Job queue stopped")
+            self._pending = []
+            self._cond.notify_all()
+
+    def submit(self, kind, func, *args, account=None, priority=0, **kwargs):
+        """Queue ``func(*args, **kwargs)`` and return its Job"""
+        job = Job(kind, func, args, kwargs, account=account, priority=priority)
+        with self._cond:
+            if self._stopped:
+                raise QueueFull("Job queue is stopped")
+            if len(self._pending) >= self.max_queued:
+                raise QueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+            self._prune()
+            self._jobs[job.job_id] = job
+            self._pending.append((-priority, next(self._seq), job))
+            self._pending.sort(key=lambda entry: entry[:2])
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs are dropped right away; running jobs stop at
+        the start of their next automation step.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_requested = True
+            job.observer.cancel()
+            if job.status == Job.QUEUED:
+                self._pending = [entry for entry in self._pending if entry[2] is not job]
+                self._finish(job, Job.CANCELLED, error="Cancelled before it started")
+            return job
+
+    def list(self):
+        with self._cond:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queued": len(self._pending),
+                "running": self._running,
+                "max_queued": self.max_queued,
+                "busy_accounts": len(self._busy_accounts),
+            }
+
+    def _next_job(self):
+        """Pop the highest-priority job whose account is not busy (lock held)"""
+        for index, (_, _, job) in enumerate(self._pending):
+            if job.account is None or job.account not in self._busy_accounts:
+                del self._pending[index]
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopped:
+                    job = self._next_job()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                job.status = Job.RUNNING
+                job.started_at = time.time()
+                self._running += 1
+                if job.account is not None:
+                    self._busy_accounts.add(job.account)
+
+            status, result, error = Job.SUCCEEDED, None, None
+            try:
+                with observe(job.observer):
+                    result = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                status, error = Job.FAILED, str(e)
+            if job.cancel_requested and status == Job.SUCCEEDED:
+                status, error = Job.CANCELLED, "Cancelled while running"
+
+            with self._cond:
+                self._running -= 1
+                self._busy_accounts.discard(job.account)
+                self._finish(job, status, result=result, error=error)
+                self._cond.notify_all()
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
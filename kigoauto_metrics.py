@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+DESCRIPTIONS = {
+    "kigoauto_driver_install_seconds": "Time to launch a Chrome driver, by outcome",
+    "kigoauto_install_phase_seconds": "Time spent in each phase of a driver launch",
+    "kigoauto_driver_init_total": "Driver initialization attempts by method and outcome",
+    "kigoauto_driver_init_fallbacks_total": "Driver launches that only succeeded with a fallback method",
+    "kigoauto_step_seconds": "Duration of login / add-to-cart steps",
+    "kigoauto_operation_seconds": "Duration of whole login / add-to-cart operations",
+    "kigoauto_operations_total": "Login / add-to-cart operations by outcome",
+    "kigoauto_login_failures_total": "Logins that did not succeed, by outcome",
+    "kigoauto_pause_seconds": "Time spent in human-like pauses and typing",
+    "kigoauto_fill_seconds": "Time to fill a form field, by fill strategy and field",
+    "kigoauto_selector_lookups_total": "Selector lookups by key and result (hit, miss, not_found)",
+    "kigoauto_cart_reads_total": "/cart-status reads by source (cache, http, browser)",
+    "kigoauto_http_request_seconds": "API request handling time by route and status",
+    "kigoauto_pool_drivers": "Drivers in the pool by state",
+    "kigoauto_executor_tasks": "Browser executor tasks by state",
+    "kigoauto_jobs": "Queued and running jobs",
+    "kigoauto_sessions": "Active account sessions",
+    "kigoauto_startup_phase_seconds": "Duration of each worker startup phase (import, hooks, ChromeDriver, pool warmup)",
+    "kigoauto_startup_ready_seconds": "Seconds from import until the worker first reported ready",
+    "kigoauto_ready": "1 once the worker has been ready",
+    "kigoauto_driver_recoveries_total": "Session browsers relaunched by the supervisor, by reason and outcome",
+}
+
+
+class Histogram:
+    """Count and sum of all observations plus a sliding window of recent ones for quantiles"""
+
+    def __init__(self, window=1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, quantiles=QUANTILES):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: None for q in quantiles}
+        # Nearest-rank quantile over the window
+        return {q: ordered[max(0, math.ceil(q * len(ordered)) - 1)] for q in quantiles}
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms, rendered in the Prometheus text format.
+
+    Metrics are keyed by name and a label set. Histograms are reported as
+    summaries (p50/p95/p99 over the last ``window`` observations plus _sum and
+    _count). Collectors registered with ``register_collector`` supply values that
+    are read at scrape time, such as pool occupancy.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.window)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the ``with`` block into histogram ``name``; an exception sets outcome="error\""""
+        start = time.time()
+        outcome = "ok"
+        try:
+            yield labels
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            labels.setdefault("outcome", outcome)
+            self.observe(name, time.time() - start, **labels)
+
+    def register_collector(self, collector):
+        """``collector()`` returns (name, type, value, labels) tuples read at every scrape"""
+        with self._lock:
+            self.collectors.append(collector)
+
+    def record_step(self, event):
+        """StepEvents listener: step and operation durations, outcomes and login failures"""
+        operation = event["operation"]
+        if event["type"] == "step":
+            self.observe("kigoauto_step_seconds", event["seconds"], operation=operation, step=event["step"])
+            return
+        self.observe("kigoauto_operation_seconds", event["seconds"], operation=operation)
+        self.inc("kigoauto_operations_total", operation=operation, outcome=event["outcome"])
+        if operation == "login" and event["outcome"] != "success":
+            self.inc("kigoauto_login_failures_total", outcome=event["outcome"])
+
+    def snapshot(self):
+        """Counters and histogram summaries as plain dicts"""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = []
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.total, 6),
+                    "quantiles": {str(q): v for q, v in histogram.quantiles().items()},
+                })
+        return {"counters": counters, "histograms": histograms}
+
+    def render(self):
+        """Everything in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = [(key, histogram.quantiles(), histogram.count, histogram.total)
+                          for key, histogram in sorted(self.histograms.items())]
+            collectors = list(self.collectors)
+
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), quantiles, count, total in histograms:
+            declare(name, "summary")
+            for q, value in quantiles.items():
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(labels + (('quantile', str(q)),))} {_format_value(value)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Warning: Metrics collector failed: {e}")
+                continue
+            for name, kind, value, labels in samples:
+                declare(name, kind)
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+# Process-wide registry shared by the automation and the API
+metrics = Metrics()
@@ -0,0 +1,202 @@
+import base64
+import json
+import re
+from urllib.parse import urlsplit
+
+from kigoauto_cart import parse_cart
+
+# Requests that add to (or update) the cart: the storefront's form action and
+# the AJAX endpoints of common cart implementations
+CART_REQUEST_PATTERN = r"/cart/(add|update|change)|add[-_]?to[-_]?cart|addtocart|/shoppingcart/add"
+
+# Cookie names that carry the cart
+CART_COOKIE_PATTERN = r"cart"
+
+# JSON keys an AJAX cart response may report the item count under
+COUNT_KEYS = ("item_count", "cart_count", "items_count", "total_quantity", "count")
+
+
+def enable_network_log(options):
+    """Ask ChromeDriver to record Network.* DevTools events in the "performance" log"""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+
+def _header(headers, name):
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def set_cookie_value(headers, pattern):
+    """Value of the first Set-Cookie in ``headers`` whose name matches ``pattern``"""
+    # DevTools joins repeated headers with newlines
+    for line in (_header(headers, "set-cookie") or "").split("\n"):
+        name, _, rest = line.partition("=")
+        if rest and pattern.search(name.strip()):
+            return rest.split(";", 1)[0].strip()
+    return None
+
+
+def cart_count_from_body(body, mime_type=""):
+    """Item count reported by an add-to-cart response (a JSON cart or the cart page); None if it has none"""
+    if not body:
+        return None
+    if "json" in (mime_type or "") or body.lstrip()[:1] in ("{", "["):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            for key in COUNT_KEYS:
+                if isinstance(data.get(key), (int, float)):
+                    return int(data[key])
+        return None
+    try:
+        cart = parse_cart(body)
+    except Exception:
+        return None
+    # Pages without any cart markup read as an empty cart; that is not a count
+    return cart["item_count"] if cart["items"] or cart["item_count"] else None
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return parts.scheme, parts.netloc.lower()
+
+
+class CartResponseWatcher:
+    """
+    Catch the add-to-cart request in Chrome's DevTools network events.
+
+    ``start`` drops the events recorded so far (call it right before clicking);
+    ``condition`` is then polled and returns, as soon as the cart request has
+    finished loading, a dict with its ``status`` (the first response, e.g. 302
+    for a form post that redirects to the cart), ``final_status`` and
+    ``cart_url`` (where it ended up), ``cart_token`` (from its Set-Cookie
+    headers) and ``cart_count`` (from the response body), and ``error`` if it
+    failed.
+
+    The cart request is the one going to ``action`` (the URL the add-to-cart
+    form posts to) when that is known, otherwise the first request to
+    ``origin`` (the storefront) matching ``pattern``; analytics beacons that
+    merely mention add_to_cart are on other hosts. Requests blocked by the
+    resource blocker do not count. Needs a driver launched with
+    ``enable_network_log``; ``supported`` turns False when the log cannot be read.
+    """
+
+    def __init__(self, driver, action=None, origin=None, pattern=CART_REQUEST_PATTERN,
+                 cookie_pattern=CART_COOKIE_PATTERN):
+        self.driver = driver
+        self.action = action.split("?", 1)[0] if action else None
+        self.origin = _origin(origin) if origin else None
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.cookie_pattern = re.compile(cookie_pattern, re.IGNORECASE)
+        self.supported = hasattr(driver, "get_log")
+        self._reset()
+
+    def _reset(self):
+        self.request_id = None
+        self.request = None
+        self.responses = []
+        self.mime_type = ""
+        self.set_cookies = []
+        self.finished = False
+        self.error = None
+
+    def start(self):
+        self._drain()
+        return self
+
+    def _drain(self):
+        if not self.supported:
+            return []
+        try:
+            return self.driver.get_log("performance")
+        except Exception as e:
+            print(f"Warning: Network events are not available, confirming add to cart from the page: {e}")
+            self.supported = False
+            return []
+
+    def condition(self, driver):
+        for entry in self._drain():
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._handle(message.get("method"), message.get("params") or {})
+        if self.error:
+            return self.result()
+        if self.finished and self.responses:
+            return self.result()
+        return False
+
+    def _handle(self, method, params):
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            request = params.get("request") or {}
+            if self.request_id is None:
+                if self._matches(request):
+                    self.request_id = request_id
+                    self.request = {"url": request.get("url"), "method": request.get("method")}
+            elif request_id == self.request_id and params.get("redirectResponse"):
+                # Redirects reuse the request id; the redirect response arrives with the next request
+                self._response(params["redirectResponse"])
+        elif request_id is None or request_id != self.request_id:
+            return
+        elif method == "Network.responseReceived":
+            response = params.get("response") or {}
+            self._response(response)
+            self.mime_type = response.get("mimeType", "")
+        elif method == "Network.responseReceivedExtraInfo":
+            # Raw headers, including the Set-Cookie lines the response event may leave out
+            self.set_cookies.append(params.get("headers") or {})
+        elif method == "Network.loadingFinished":
+            self.finished = True
+        elif method == "Network.loadingFailed":
+            if params.get("blockedReason") or params.get("errorText") == "net::ERR_BLOCKED_BY_CLIENT":
+                # Dropped by the resource blocker, so not the storefront's cart request; keep looking
+                self._reset()
+            else:
+                self.error = params.get("errorText") or "failed"
+
+    def _matches(self, request):
+        url = request.get("url", "")
+        if self.action:
+            return url.split("?", 1)[0] == self.action
+        if self.origin and _origin(url) != self.origin:
+            return False
+        # A GET only counts when its URL says it adds; "/cart/" pages are plain reads
+        return bool(self.pattern.search(url)) and (request.get("method") != "GET" or "add" in url.lower())
+
+    def _response(self, response):
+        self.responses.append({"status": response.get("status"), "url": response.get("url")})
+        self.set_cookies.append(response.get("headers") or {})
+
+    def result(self):
+        first = self.responses[0] if self.responses else {}
+        last = self.responses[-1] if self.responses else {}
+        token = None
+        for headers in self.set_cookies:
+            token = set_cookie_value(headers, self.cookie_pattern) or token
+        return {
+            "request_url": self.request["url"] if self.request else None,
+            "status": first.get("status"),
+            "final_status": last.get("status"),
+            "cart_url": last.get("url"),
+            "cart_token": token,
+            "cart_count": None if self.error else cart_count_from_body(self._body(), self.mime_type),
+            "error": self.error,
+        }
+
+    def _body(self):
+        try:
+            response = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": self.request_id})
+        except Exception:
+            # Evicted from the buffer, or no body (e.g. a 204)
+            return None
+        body = response.get("body", "")
+        if response.get("base64Encoded"):
+            body = base64.b64decode(body).decode("utf-8", "replace")
+        return body
@@ -0,0 +1,270 @@
+import threading
+import time
+import traceback
+
+from kigoauto_automation import KigoAutoLogin
+
+
+class DriverPool:
+    """
+    Keep a number of pre-launched KigoAutoLogin drivers warm and hand one out per request.
+
+    Drivers sitting idle longer than ``idle_ttl`` seconds, or alive longer than
+    ``max_age`` seconds, are recycled in the background. Drivers handed back with
+    ``release`` have been used by an account, so they are always retired rather
+    than returned to the idle list; a retired driver is closed under its lock,
+    so a request still running on it finishes first.
+    """
+
+    def __init__(self, size=2, idle_ttl=600, max_age=3600, headless=True, factory=None,
+                 maintenance_interval=5):
+        self.size = size
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age
+        self.headless = headless
+        self.factory = factory or (lambda: KigoAutoLogin(headless=self.headless))
+        self.maintenance_interval = maintenance_interval
+
+        self._idle = []  # list of (kigo, idle_since)
+        self._retiring = []
+        self._in_use = 0
+        self._launching = 0
+        self._checking = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.launched = 0
+        self.recycled = 0
+        self.cold_starts = 0
+        self.last_error = None
+
+    def start(self):
+        """Start the background thread that keeps the pool filled"""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._maintain, name="driver-pool", daemon=True)
+                self._thread.start()
+
+    def acquire(self, timeout=None):
+        """
+        Take a warm driver out of the pool.
+
+        If no warm driver is available within ``timeout`` seconds (or right away
+        when ``timeout`` is None) a driver is launched in the calling thread.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                while self._idle:
+                    kigo, idle_since = self._idle.pop()
+                    if self._is_expired(kigo, idle_since):
+                        self._retiring.append(kigo)
+                        self.recycled += 1
+                        self._cond.notify_all()
+                        continue
+                    self._in_use += 1
+                    self._cond.notify_all()
+                    return kigo
+                if deadline is None or self._launching == 0:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                # A launch is in flight; wait for it rather than starting another
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self.cold_starts += 1
+            self._cond.notify_all()
+
+        print("Driver pool empty, launching a driver on demand")
+        try:
+            kigo = self._launch()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify_all()
+            raise
+        return kigo
+
+    def release(self, kigo):
+        """Hand a driver back; it is closed in the background and replaced by a warm one"""
+        if kigo is None:
+            return
+        with self._cond:
+            self._in_use = max(0, self._in_use - 1)
+            self._retiring.append(kigo)
+            self._cond.notify_all()
+
+    def check_idle(self, check):
+        """
+        Run ``check(kigo)`` on every idle driver and retire the ones it rejects.
+
+        The drivers are taken out of the idle list while they are checked, so
+        they cannot be handed out half-checked. Returns the number retired.
+        """
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+            self._checking += len(idle)
+        healthy = []
+        unhealthy = []
+        for kigo, idle_since in idle:
+            try:
+                ok = check(kigo)
+            except Exception as e:
+                print(f"Warning: Driver health check failed: {e}")
+                ok = False
+            (healthy if ok else unhealthy).append((kigo, idle_since))
+        with self._cond:
+            self._checking -= len(idle)
+            closed = self._closed
+            if not closed:
+                self._idle.extend(healthy)
+                self._retiring.extend(kigo for kigo, _ in unhealthy)
+            self.recycled += len(unhealthy)
+            self._cond.notify_all()
+        if closed:
+            # The pool closed during the check; nobody else will close these
+            for kigo, _ in healthy + unhealthy:
+                self._close_driver(kigo)
+        return len(unhealthy)
+
+    def wait_warm(self, count=1, timeout=None):
+        """
+        Block until the pool has launched ``count`` drivers (capped at ``size``)
+        since it was created; returns False on timeout or when the pool closes.
+        """
+        count = min(count, self.size)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self.launched < count:
+                if self._closed:
+                    return False
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stats(self):
+        """Return a snapshot of pool occupancy"""
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "launching": self._launching,
+                "retiring": len(self._retiring),
+                "launched": self.launched,
+                "recycled": self.recycled,
+                "cold_starts": self.cold_starts,
+                "last_error": self.last_error,
+            }
+
+    def close(self):
+        """Stop maintenance and close every driver the pool still owns"""
+        with self._cond:
+            self._closed = True
+            drivers = [kigo for kigo, _ in self._idle] + self._retiring
+            self._idle = []
+            self._retiring = []
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.maintenance_interval + 1)
+        for kigo in drivers:
+            self._close_driver(kigo)
+
+    def _is_expired(self, kigo, idle_since):
+        now = time.time()
+        if self.idle_ttl and now - idle_since > self.idle_ttl:
+            return True
+        if self.max_age and now - getattr(kigo, "launched_at", now) > self.max_age:
+            return True
+        return False
+
+    def _launch(self):
+        kigo = self.factory()
+        with self._cond:
+            self.launched += 1
+            self._cond.notify_all()
+        return kigo
+
+    def _close_driver(self, kigo):
+        """Close ``kigo`` once a request still running on it (e.g. of an evicted session) lets go"""
+        try:
+            with kigo.close_lock:
+                kigo.close()
+        except Exception as e:
+            print(f"Warning: Could not close pooled driver: {e}")
+
+    def _maintain(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    leftovers = self._retiring
+                    self._retiring = []
+                    break
+                # Move expired idle drivers to the retire list
+                fresh = []
+                for kigo, idle_since in self._idle:
+                    if self._is_expired(kigo, idle_since):
+                        self._retiring.append(kigo)
+                        self.recycled += 1
+                    else:
+                        fresh.append((kigo, idle_since))
+                self._idle = fresh
+
+                retiring = self._retiring
+                self._retiring = []
+                missing = self.size - len(self._idle) - self._launching - self._checking
+                launch = missing > 0 and not retiring
+                if launch:
+                    self._launching += 1
+
+            if retiring:
+                # Close used/expired drivers before launching replacements
+                for kigo in retiring:
+                    if kigo.close_lock.acquire(blocking=False):
+                        try:
+                            self._close_driver(kigo)
+                        finally:
+                            kigo.close_lock.release()
+                    else:
+                        # Still busy; close it when its holder is done, without holding up refills
+                        threading.Thread(target=self._close_driver, args=(kigo,),
+                                         name="driver-close", daemon=True).start()
+                continue
+
+            if launch:
+                kigo = None
+                error = None
+                try:
+                    kigo = self._launch()
+                except Exception as e:
+                    print(f"Driver pool failed to launch a driver: {e}")
+                    traceback.print_exc()
+                    error = str(e).strip()
+                    error = error.splitlines()[0] if error else type(e).__name__
+                with self._cond:
+                    self._launching -= 1
+                    self.last_error = None if kigo is not None else error
+                    if kigo is not None and not self._closed:
+                        self._idle.append((kigo, time.time()))
+                    elif kigo is not None:
+                        self._retiring.append(kigo)
+                    self._cond.notify_all()
+                if kigo is None:
+                    # Back off before retrying a failed launch
+                    with self._cond:
+                        self._cond.wait(self.maintenance_interval)
+                continue
+
+            with self._cond:
+                if not self._closed and not self._retiring:
+                    self._cond.wait(self.maintenance_interval)
+
+        for kigo in leftovers:
+            self._close_driver(kigo)
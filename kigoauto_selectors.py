@@ -0,0 +1,238 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from selenium.common import WebDriverException
+
+from kigoauto_metrics import metrics
+
+# Runs in the page: walks the ordered candidate list and returns the first
+# matching element that passes the visibility/enabled checks with its index,
+# plus which candidates match anything at all (the lookup's layout fingerprint,
+# see SelectorCache).
+RESOLVE_SCRIPT = """
+var candidates = arguments[0], requireVisible = arguments[1], requireEnabled = arguments[2];
+
+function isVisible(el) {
+    if (!el.isConnected) return false;
+    var style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') return false;
+    var rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+function matches(candidate) {
+    if (candidate.type === 'xpath') {
+        var result = document.evaluate(candidate.query, document, null,
+                                       XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var nodes = [];
+        for (var j = 0; j < result.snapshotLength; j++) nodes.push(result.snapshotItem(j));
+        return nodes;
+    }
+    return Array.prototype.slice.call(document.querySelectorAll(candidate.query));
+}
+
+var found = null, foundIndex = -1, present = [];
+for (var i = 0; i < candidates.length; i++) {
+    var nodes;
+    try {
+        nodes = matches(candidates[i]);
+    } catch (e) {
+        nodes = [];  // invalid selector for this engine
+    }
+    present.push(nodes.length > 0);
+    if (found) continue;
+    for (var k = 0; k < nodes.length; k++) {
+        var el = nodes[k];
+        if (el.nodeType !== 1) continue;
+        if (requireVisible && !isVisible(el)) continue;
+        if (requireEnabled && (el.disabled || el.getAttribute('aria-disabled') === 'true')) continue;
+        found = el;
+        foundIndex = i;
+        break;
+    }
+}
+return [found, foundIndex, present];
+"""
+
+CONTAINS_RE = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*)?[^:]*:contains\(['\"](?P<text>[^'\"]*)['\"]\)$")
+
+
+def to_candidate(selector):
+    """
+    Translate one entry of a selector list into a {type, query} candidate.
+
+    Entries starting with "//" are XPath; jQuery-style ``tag:contains('text')``
+    (not valid CSS) becomes ``//tag[contains(text(), 'text')]``; everything else
+    is CSS.
+    """
+    if selector.startswith("//") or selector.startswith("(//"):
+        return {"type": "xpath", "query": selector}
+    match = CONTAINS_RE.match(selector)
+    if match:
+        tag = match.group("tag") or "*"
+        return {"type": "xpath", "query": f"//{tag}[contains(text(), '{match.group('text')}')]"}
+    return {"type": "css", "query": selector}
+
+
+class SelectorResolver:
+    """
+    Resolve an ordered list of CSS/XPath selectors in one WebDriver round-trip.
+
+    Instead of a ``find_element`` plus ``is_displayed``/``is_enabled`` call per
+    candidate, the whole list is sent to the page with ``execute_script`` and the
+    first visible (and optionally enabled) match comes back with the selector
+    that found it.
+    """
+
+    def __init__(self, driver, cache=None):
+        self.driver = driver
+        self.cache = cache
+
+    def resolve(self, selectors, visible=True, enabled=False, key=None, record=True):
+        """
+        Return (element, selector) for the first match, or (None, None).
+
+        With a ``key`` and a cache, the selector that won last time for that key
+        is tried first, and the outcome is recorded unless ``record`` is False.
+        """
+        ordered = self.cache.order(key, selectors) if self.cache is not None and key else list(selectors)
+        candidates = [to_candidate(selector) for selector in ordered]
+        try:
+            element, index, present = self.driver.execute_script(RESOLVE_SCRIPT, candidates, visible, enabled)
+        except WebDriverException as e:
+            print(f"Selector resolution failed: {e}")
+            return None, None
+        selector = ordered[int(index)] if element is not None else None
+        if self.cache is not None and key and (record or element is not None):
+            # Fingerprint in the caller's order so it does not depend on the cached winner
+            matched = {candidate for candidate, hit in zip(ordered, present) if hit}
+            layout = "".join("1" if candidate in matched else "0" for candidate in selectors)
+            self.cache.record(key, selectors, selector, layout)
+        return element, selector
+
+    def condition(self, selectors, visible=True, enabled=False, key=None):
+        """Wait condition returning (element, selector) once any selector matches"""
+        def check(driver):
+            # Only the final outcome counts towards the cache, not every poll
+            element, selector = self.resolve(selectors, visible=visible, enabled=enabled, key=key, record=False)
+            return (element, selector) if element is not None else False
+        return check
+
+
+class SelectorCache:
+    """
+    Persistent record of which selector won for each lookup (e.g. "login.email").
+
+    ``order`` puts the remembered winner first so it usually matches on the first
+    candidate. The winner is forgotten when the lookup's layout fingerprint (which
+    candidates match anything on the page) changes, or when it misses
+    ``max_misses`` times in a row. ``report`` lists hit and
+    miss counters per lookup and the candidates that have never matched.
+    """
+
+    def __init__(self, path="kigoauto_selectors.json", max_misses=3, flush_every=10):
+        self.path = path
+        self.max_misses = max_misses
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load selector cache {self.path}: {e}")
+            self.entries = {}
+
+    def order(self, key, selectors):
+        """Return ``selectors`` with the cached winner for ``key`` moved to the front"""
+        with self._lock:
+            winner = self.entries.get(key, {}).get("winner")
+        if winner in selectors:
+            return [winner] + [selector for selector in selectors if selector != winner]
+        return list(selectors)
+
+    def record(self, key, selectors, winner, layout=None):
+        """Record that ``winner`` (None if nothing matched) resolved lookup ``key``"""
+        with self._lock:
+            entry = self.entries.setdefault(key, {
+                "winner": None, "layout": None, "hits": 0, "misses": 0,
+                "consecutive_misses": 0, "layout_changes": 0, "wins": {},
+            })
+            entry["candidates"] = list(selectors)
+            entry["last_seen"] = time.time()
+
+            if layout and entry["layout"] and layout != entry["layout"]:
+                # A different set of candidates matches now; the site layout changed
+                print(f"Layout change detected for '{key}', invalidating cached selector")
+                entry["layout_changes"] += 1
+                entry["winner"] = None
+            if layout:
+                entry["layout"] = layout
+
+            if winner is None:
+                metrics.inc("kigoauto_selector_lookups_total", key=key, result="not_found")
+            else:
+                metrics.inc("kigoauto_selector_lookups_total", key=key,
+                            result="hit" if winner == entry["winner"] else "miss")
+            if winner is not None and winner == entry["winner"]:
+                entry["hits"] += 1
+                entry["consecutive_misses"] = 0
+            else:
+                entry["misses"] += 1
+                if winner is not None:
+                    entry["winner"] = winner
+                    entry["consecutive_misses"] = 0
+                else:
+                    entry["consecutive_misses"] += 1
+                    if entry["consecutive_misses"] >= self.max_misses:
+                        entry["winner"] = None
+            if winner is not None:
+                entry["wins"][winner] = entry["wins"].get(winner, 0) + 1
+
+            self._dirty += 1
+            flush = self._dirty >= self.flush_every or entry["misses"] == 1
+        if flush:
+            self.flush()
+
+    def report(self):
+        """Per-lookup hit/miss counters and the candidates that have never matched"""
+        with self._lock:
+            report = {}
+            for key, entry in sorted(self.entries.items()):
+                lookups = entry["hits"] + entry["misses"]
+                report[key] = {
+                    "winner": entry["winner"],
+                    "hits": entry["hits"],
+                    "misses": entry["misses"],
+                    "hit_rate": round(entry["hits"] / lookups, 3) if lookups else None,
+                    "layout_changes": entry["layout_changes"],
+                    "wins": dict(entry["wins"]),
+                    "stale": [c for c in entry.get("candidates", []) if c not in entry["wins"]],
+                }
+            return report
+
+    def flush(self):
+        """Write the cache to disk atomically (temp file + rename)"""
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self.entries, indent=2)
+            self._dirty = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".selectors_", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Warning: Could not save selector cache {self.path}: {e}")
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+LIFECYCLES = ("keep-alive", "operations", "immediate")
+
+
+class Session:
+    """Driver, cookie jar and cart token owned by one logged-in account"""
+
+    def __init__(self, account, kigo=None, session_id=None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.account = account
+        self.kigo = kigo
+        self.cookies = {}
+        self.session_cookies = []
+        self.cart_token = ""
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.operations = 0
+
+    def touch(self):
+        self.last_used = time.time()
+
+    def update_cookies(self, session_cookies):
+        """Replace the cookie jar with cookies read from the browser and pick out the cart token"""
+        self.session_cookies = session_cookies
+        self.cookies = {}
+        for cookie in session_cookies:
+            self.cookies[cookie["name"]] = cookie["value"]
+            # Look for cart-related cookies
+            if "cart" in cookie["name"].lower():
+                self.cart_token = cookie["value"]
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            "session_id": self.session_id,
+            "account": self.account,
+            "browser_open": self.kigo is not None,
+            "total_cookies": len(self.cookies),
+            "cart_token": self.cart_token,
+            "operations": self.operations,
+            "age": round(now - self.created_at, 1),
+            "idle": round(now - self.last_used, 1),
+        }
+
+
+class SessionLifecycle:
+    """
+    When a session hands its browser back.
+
+    ``keep-alive`` keeps it until the session is idle past the registry's
+    ``idle_timeout``, ``operations`` after ``max_operations`` cart operations,
+    and ``immediate`` after every cart operation (the old auto-close behaviour).
+    """
+
+    def __init__(self, mode="keep-alive", max_operations=20):
+        if mode not in LIFECYCLES:
+            raise ValueError(f"Unknown session lifecycle '{mode}', expected one of {LIFECYCLES}")
+        self.mode = mode
+        self.max_operations = max_operations
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.environ.get("KIGOAUTO_SESSION_LIFECYCLE", "keep-alive"),
+            max_operations=int(os.environ.get("KIGOAUTO_SESSION_MAX_OPERATIONS", "20")),
+        )
+
+    def should_release(self, session):
+        if self.mode == "immediate":
+            return True
+        if self.mode == "operations":
+            return session.operations >= self.max_operations
+        return False
+
+
+class SessionRegistry:
+    """
+    Sessions keyed by session ID, at most one per account.
+
+    When ``max_sessions`` is reached the least recently used session is evicted,
+    and sessions idle for longer than ``idle_timeout`` seconds are dropped by
+    ``expire_idle``. Evicted sessions are passed to ``on_evict`` so their driver
+    can be handed back; ``end_operation`` does the same once the ``lifecycle``
+    says a session is done with its browser.
+    """
+
+    def __init__(self, max_sessions=8, idle_timeout=1800, on_evict=None, lifecycle=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self.lifecycle = lifecycle or SessionLifecycle()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, account, kigo=None):
+        """Register a new session for ``account``, replacing any session it already has"""
+        session = Session(account, kigo)
+        evicted = []
+        with self._lock:
+            for existing in list(self._sessions.values()):
+                if existing.account == account:
+                    evicted.append(self._sessions.pop(existing.session_id))
+            while self.max_sessions and len(self._sessions) >= self.max_sessions:
+                _, lru = self._sessions.popitem(last=False)
+                print(f"Session limit reached, evicting least recently used session for {lru.account}")
+                evicted.append(lru)
+            self._sessions[session.session_id] = session
+        self._evict(evicted)
+        return session
+
+    def get(self, session_id=None):
+        """
+        Look up a session and mark it as recently used.
+
+        Without a ``session_id`` the only session is returned, so single-account
+        clients keep working without passing a handle; with several sessions
+        open there is no telling which account is meant, and None is returned.
+        """
+        with self._lock:
+            if session_id is None:
+                if len(self._sessions) != 1:
+                    return None
+                session_id = next(iter(self._sessions))
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            session.touch()
+            return session
+
+    def find_by_account(self, account):
+        with self._lock:
+            for session in self._sessions.values():
+                if session.account == account:
+                    return session
+        return None
+
+    def remove(self, session_id):
+        """Remove a session without calling ``on_evict``; the caller cleans it up"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def end_operation(self, session):
+        """
+        Count a finished cart operation; returns True if the lifecycle released
+        the session's browser (the session itself, with its cookies, stays).
+        """
+        with self._lock:
+            session.operations += 1
+            release = session.kigo is not None and self.lifecycle.should_release(session)
+        if release:
+            print(f"Releasing the browser of {session.account} ({self.lifecycle.mode} session lifecycle)")
+            self._evict([session])
+        return release
+
+    def expire_idle(self):
+        """Evict sessions idle for longer than ``idle_timeout``"""
+        if not self.idle_timeout:
+            return []
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            expired = [s for s in self._sessions.values() if s.last_used < cutoff]
+            for session in expired:
+                del self._sessions[session.session_id]
+        for session in expired:
+            print(f"Session for {session.account} idle for over {self.idle_timeout}s, evicting")
+        self._evict(expired)
+        return expired
+
+    def clear(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        self._evict(sessions)
+
+    def list(self):
+        with self._lock:
+            return [session.to_dict() for session in self._sessions.values()]
+
+    def snapshot(self):
+        """The current Session objects, without marking them as used"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def _evict(self, sessions):
+        if not self.on_evict:
+            return
+        for session in sessions:
+            try:
+                self.on_evict(session)
+            except Exception as e:
+                print(f"Warning: Could not clean up session {session.session_id}: {e}")
@@ -0,0 +1,67 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupPhases:
+    """
+    How long each phase of bringing a worker up took, measured from ``started_at``.
+
+    Phases are timed with ``phase(name)`` (import, startup hooks, ChromeDriver
+    resolution, first warm driver, ...); ``ready()`` records when the worker
+    first reported ready. Each phase keeps its duration, when it ended relative
+    to ``started_at`` and the error it failed with, if any.
+    """
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at or time.time()
+        self.ready_at = None
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            self.record(name, start, error)
+
+    def record(self, name, start, error=None):
+        end = time.time()
+        with self._lock:
+            self.phases[name] = {
+                "seconds": round(end - start, 3),
+                "finished_after": round(end - self.started_at, 3),
+                "error": error,
+            }
+
+    def ready(self):
+        """Mark the worker ready (the first call wins); returns seconds since start"""
+        with self._lock:
+            if self.ready_at is None:
+                self.ready_at = time.time()
+            return round(self.ready_at - self.started_at, 3)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "phases": {name: dict(phase) for name, phase in self.phases.items()},
+                "ready_after": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+                "uptime": round(time.time() - self.started_at, 3),
+            }
+
+    def collect(self):
+        """Metrics collector: phase durations and time to ready"""
+        with self._lock:
+            phases = [(name, phase["seconds"]) for name, phase in self.phases.items()]
+            ready_after = self.ready_at - self.started_at if self.ready_at else None
+        for name, seconds in phases:
+            yield "kigoauto_startup_phase_seconds", "gauge", seconds, {"phase": name}
+        yield "kigoauto_ready", "gauge", 1 if ready_after is not None else 0, {}
+        if ready_after is not None:
+            yield "kigoauto_startup_ready_seconds", "gauge", round(ready_after, 3), {}
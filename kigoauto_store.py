@@ -0,0 +1,123 @@
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# scrypt cost parameters for the stored password hashes (~50 ms and 16 MiB per hash)
+SCRYPT_PARAMS = {"n": 2 ** 14, "r": 8, "p": 1, "dklen": 32}
+
+
+def hash_password(password, salt=None):
+    """Salted scrypt hash of ``password`` as "salt$hash" (hex)"""
+    salt = salt if salt is not None else os.urandom(16)
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, **SCRYPT_PARAMS)
+    return f"{salt.hex()}${digest.hex()}"
+
+
+def check_password(password, stored):
+    """Whether ``password`` matches a hash made by ``hash_password``"""
+    if not stored or "$" not in stored:
+        return False
+    salt, _ = stored.split("$", 1)
+    try:
+        candidate = hash_password(password, bytes.fromhex(salt))
+    except ValueError:
+        return False
+    return hmac.compare_digest(candidate, stored)
+
+
+class SessionStore:
+    """
+    Persistent cache of login cookies keyed by account.
+
+    An entry is only handed out for the password it was logged in with: a
+    salted scrypt hash of that password is stored next to the cookies, and
+    ``load`` returns nothing when the submitted password does not match.
+
+    Entries live in a SQLite database so several worker processes can share
+    them; writes are single-statement transactions and the database runs in WAL
+    mode, so readers never see a half-written entry. Each entry expires at the
+    earliest ``expiry`` of its cookies, or after ``default_ttl`` seconds when the
+    cookies are all session cookies.
+    """
+
+    def __init__(self, path="kigoauto_sessions.db", default_ttl=12 * 3600):
+        self.path = path
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " account TEXT PRIMARY KEY,"
+                " cookies TEXT NOT NULL,"
+                " saved_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " password_hash TEXT)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            if "password_hash" not in columns:
+                # Databases from before credential checks; their entries never match
+                conn.execute("ALTER TABLE sessions ADD COLUMN password_hash TEXT")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def expires_at(self, cookies, now=None):
+        """Return when a cookie jar stops being usable: its earliest cookie expiry"""
+        now = now or time.time()
+        expiries = [cookie["expiry"] for cookie in cookies if cookie.get("expiry") and cookie["expiry"] > now]
+        if expiries:
+            return min(min(expiries), now + self.default_ttl)
+        return now + self.default_ttl
+
+    def save(self, account, cookies, password=None):
+        """
+        Store (or replace) the cookies for ``account``.
+
+        ``password`` is the one the login used; without it (a refresh of the
+        cookies after an add-to-cart) the entry keeps its stored hash.
+        """
+        now = time.time()
+        password_hash = hash_password(password) if password is not None else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (account, cookies, saved_at, expires_at, password_hash) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (account) DO UPDATE SET cookies = excluded.cookies, saved_at = excluded.saved_at,"
+                " expires_at = excluded.expires_at,"
+                " password_hash = COALESCE(excluded.password_hash, sessions.password_hash)",
+                (account, json.dumps(cookies), now, self.expires_at(cookies, now), password_hash),
+            )
+
+    def load(self, account, password):
+        """Return the cached cookies for ``account``, or None if missing, expired or saved for another password"""
+        row = self._connect().execute(
+            "SELECT cookies, expires_at, password_hash FROM sessions WHERE account = ?", (account,)
+        ).fetchone()
+        if row is None:
+            return None
+        cookies, expires_at, password_hash = row
+        if expires_at <= time.time():
+            self.invalidate(account)
+            return None
+        if not check_password(password, password_hash):
+            return None
+        return json.loads(cookies)
+
+    def invalidate(self, account):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE account = ?", (account,))
+
+    def purge_expired(self):
+        """Delete every expired entry and return how many were removed"""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
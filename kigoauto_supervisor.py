@@ -0,0 +1,130 @@
+import threading
+import time
+import traceback
+
+from kigoauto_automation import live_profile_dirs
+from kigoauto_browser import kill_orphaned_chrome, reap_zombie_children, sweep_profile_dirs
+from kigoauto_metrics import metrics
+
+
+class BrowserSupervisor:
+    """
+    Periodic health checks for every browser the API holds.
+
+    Every ``interval`` seconds each session's driver is pinged (skipped while a
+    request is using it) and checked against ``max_rss_mb``, ``max_pages`` and
+    ``max_age``. A driver that is dead, hung or over a limit is relaunched in
+    place with the session's cookies (``KigoAutoLogin.recover``), so the session
+    keeps working. Idle pool drivers that fail the check are retired. Each
+    round also reaps zombie children, kills Chrome processes orphaned by a
+    crashed ChromeDriver and removes ``chrome_user_data_*`` directories nobody
+    uses any more.
+    """
+
+    def __init__(self, sessions, pool, interval=30, ping_timeout=5, max_rss_mb=1024, max_pages=200,
+                 max_age=3600, profile_min_age=600):
+        self.sessions = sessions
+        self.pool = pool
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self.max_rss_mb = max_rss_mb
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self.profile_min_age = profile_min_age
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {
+            "rounds": 0, "checks": 0, "skipped_busy": 0, "recovered": 0, "recovery_failures": 0,
+            "idle_retired": 0, "zombies_reaped": 0, "orphans_killed": 0, "profile_dirs_removed": 0,
+        }
+        self.last_problems = {}
+
+    def start(self):
+        if self._thread is None and self.interval:
+            self._thread = threading.Thread(target=self._run, name="browser-supervisor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.ping_timeout + 1)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, last_problems=dict(self.last_problems))
+
+    def problem(self, report):
+        """Why a driver with this ``KigoAutoLogin.health`` report should be replaced, or None"""
+        if not report["alive"]:
+            return "unresponsive"
+        if self.max_rss_mb and report["rss_bytes"] and report["rss_bytes"] > self.max_rss_mb * 1024 * 1024:
+            return "memory"
+        if self.max_pages and report["page_loads"] >= self.max_pages:
+            return "pages"
+        if self.max_age and report["age"] and report["age"] > self.max_age:
+            return "age"
+        return None
+
+    def check_once(self):
+        """Run one round of checks and cleanup"""
+        self._count("rounds")
+        for session in self.sessions.snapshot():
+            self._check_session(session)
+        self._count("idle_retired", self.pool.check_idle(self._idle_is_healthy))
+        self._cleanup()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"Browser supervisor round failed: {e}")
+                traceback.print_exc()
+
+    def _check_session(self, session):
+        kigo = session.kigo
+        if kigo is None:
+            return
+        # A request is driving this browser; check it next round instead of queueing behind it
+        if not kigo.lock.acquire(blocking=False):
+            self._count("skipped_busy")
+            return
+        try:
+            if session.kigo is not kigo:
+                return
+            self._count("checks")
+            report = kigo.health(self.ping_timeout)
+            reason = self.problem(report)
+            if reason is None:
+                return
+            print(f"Browser for {session.account} is unhealthy ({reason}: {report.get('error', '')}), relaunching")
+            with self._lock:
+                self.last_problems[session.account] = {"reason": reason, "at": time.time(), **report}
+            try:
+                # A dead browser cannot hand over its cookies; use the session's last known jar
+                kigo.recover(cookies=None if report["alive"] else session.session_cookies)
+                self._count("recovered")
+                metrics.inc("kigoauto_driver_recoveries_total", reason=reason, outcome="ok")
+            except Exception as e:
+                print(f"Could not relaunch the browser for {session.account}: {e}")
+                self._count("recovery_failures")
+                metrics.inc("kigoauto_driver_recoveries_total", reason=reason, outcome="error")
+                session.kigo = None
+                self.pool.release(kigo)
+        finally:
+            kigo.lock.release()
+
+    def _idle_is_healthy(self, kigo):
+        return self.problem(kigo.health(self.ping_timeout)) is None
+
+    def _cleanup(self):
+        live = live_profile_dirs()
+        self._count("zombies_reaped", reap_zombie_children())
+        self._count("orphans_killed", len(kill_orphaned_chrome(live)))
+        self._count("profile_dirs_removed", len(sweep_profile_dirs(live, self.profile_min_age)))
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self.counters[name] += amount
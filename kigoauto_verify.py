@@ -0,0 +1,138 @@
+from selenium.common import WebDriverException
+
+VERIFY_SIGNALS = ("cookie", "logout", "url")
+
+# Authentication cookies (exact names) the storefront's ASP.NET platforms set only
+# once a login succeeded; generic server session cookies (ASP.NET_SessionId,
+# PHPSESSID) are set for anonymous visitors too and prove nothing
+AUTH_COOKIE_NAMES = (".ASPXAUTH", ".AspNetCore.Identity.Application", ".Nop.Authentication")
+
+# Fragments of logout link targets
+LOGOUT_HREF_MARKERS = ("logout", "logoff", "signout", "sign-out", "log-out")
+
+LOGOUT_SELECTORS = [f"a[href*='{marker}' i]" for marker in LOGOUT_HREF_MARKERS] + ["[class*='logout' i]"]
+
+LOGIN_ERROR_SELECTORS = [
+    ".error",
+    ".error-msg",
+    ".alert-danger",
+    ".validation-summary-errors",
+    ".field-validation-error",
+    "[class*='login-error' i]",
+]
+
+# Path fragments of pages that are still part of the login flow
+LOGIN_PATH_MARKERS = ("login", "signin", "sign-in", "sign_in")
+
+# One round trip per poll: URL, whether a logout control exists, visible error
+# text, and whether the page the form was submitted from is still loaded
+PROBE_SCRIPT = """
+var logout = arguments[0], errors = arguments[1], marker = arguments[2];
+var error = '';
+var candidates = errors ? document.querySelectorAll(errors) : [];
+for (var i = 0; i < candidates.length; i++) {
+    var el = candidates[i];
+    var text = (el.innerText || '').trim();
+    if (text && el.offsetParent !== null) { error = text; break; }
+}
+return [location.href, !!(logout && document.querySelector(logout)), error, !!window[marker]];
+"""
+
+MARK_SCRIPT = "window[arguments[0]] = true;"
+SUBMIT_MARKER = "__kigoautoLoginSubmitted"
+
+
+def auth_cookie_names(spec):
+    """Parse a comma-separated list of authentication cookie names; empty means AUTH_COOKIE_NAMES"""
+    names = tuple(name.strip() for name in (spec or "").split(",") if name.strip())
+    return names or AUTH_COOKIE_NAMES
+
+
+def parse_verify_spec(spec):
+    """Parse "cookie,logout,url" into a tuple of signals, in the order they are checked"""
+    signals = tuple(item.strip() for item in (spec or "").split(",") if item.strip())
+    for signal in signals:
+        if signal not in VERIFY_SIGNALS:
+            raise ValueError(f"Unknown login signal '{signal}', expected one of {VERIFY_SIGNALS}")
+    return signals or VERIFY_SIGNALS
+
+
+class LoginVerifier:
+    """
+    Decide whether a login worked from a few targeted signals instead of the page source.
+
+    - ``cookie``: an authentication cookie (one of ``cookie_names``) appears or changes value
+    - ``logout``: a logout link or button shows up
+    - ``url``: the browser leaves the login page for one outside the login flow
+
+    ``prepare`` snapshots the page right before the form is submitted;
+    ``condition`` is then polled and returns ("failure", message) once the login
+    form comes back with a visible error, so bad credentials do not wait out the
+    timeout, and otherwise ("success", signal) as soon as any enabled signal
+    fires. The error is checked first: a failed login may still set cookies.
+    """
+
+    def __init__(self, signals=VERIFY_SIGNALS, cookie_names=AUTH_COOKIE_NAMES,
+                 logout_selectors=None, error_selectors=None):
+        self.signals = tuple(signals)
+        for signal in self.signals:
+            if signal not in VERIFY_SIGNALS:
+                raise ValueError(f"Unknown login signal '{signal}', expected one of {VERIFY_SIGNALS}")
+        self.cookie_names = {name.lower() for name in cookie_names}
+        self.logout_selector = ", ".join(LOGOUT_SELECTORS if logout_selectors is None else logout_selectors)
+        self.error_selector = ", ".join(LOGIN_ERROR_SELECTORS if error_selectors is None else error_selectors)
+
+    @classmethod
+    def from_spec(cls, spec, cookies=None):
+        return cls(parse_verify_spec(spec), auth_cookie_names(cookies))
+
+    def prepare(self, driver):
+        """Snapshot session cookies, URL and error text before submitting; returns the state for ``condition``"""
+        driver.execute_script(MARK_SCRIPT, SUBMIT_MARKER)
+        url, _, error, _ = self._probe(driver)
+        return {
+            "url": url,
+            "error": error,
+            "cookies": self._session_cookies(driver) if "cookie" in self.signals else {},
+        }
+
+    def condition(self, state):
+        def verified(driver):
+            url, logout, error, same_page = self._probe(driver)
+            # The form came back (reloaded, or updated in place) with an error on it
+            still_on_form = same_page or url == state["url"] or self._is_login_url(url)
+            if error and still_on_form and (not same_page or error != state["error"]):
+                return "failure", error[:200]
+            for signal in self.signals:
+                if signal == "cookie" and self._new_session_cookie(driver, state):
+                    return "success", "cookie"
+                if signal == "logout" and logout:
+                    return "success", "logout"
+                if signal == "url" and url != state["url"] and not self._is_login_url(url):
+                    return "success", "url"
+            return False
+        return verified
+
+    def _probe(self, driver):
+        try:
+            return driver.execute_script(PROBE_SCRIPT, self.logout_selector, self.error_selector, SUBMIT_MARKER)
+        except WebDriverException:
+            # Mid-navigation; the next poll sees the new page
+            return driver.current_url, False, "", False
+
+    def _session_cookies(self, driver):
+        if not self.cookie_names:
+            return {}
+        return {cookie["name"]: cookie.get("value") for cookie in driver.get_cookies()
+                if cookie["name"].lower() in self.cookie_names}
+
+    def _new_session_cookie(self, driver, state):
+        for name, value in self._session_cookies(driver).items():
+            if state["cookies"].get(name) != value:
+                return name
+        return None
+
+    @staticmethod
+    def _is_login_url(url):
+        url = url.lower()
+        return any(marker in url for marker in LOGIN_PATH_MARKERS)
@@ -0,0 +1,114 @@
+import time
+
+from selenium.common import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+class BudgetExceeded(TimeoutException):
+    """An operation used up its latency budget while waiting"""
+
+
+class LatencyBudget:
+    """
+    Deadline shared by every wait inside one operation (a login, an add-to-cart).
+
+    Each ``wait`` is capped by what is left of the budget, so a string of slow
+    steps fails the operation once instead of each step waiting its own full
+    timeout.
+    """
+
+    def __init__(self, seconds, name="operation"):
+        self.seconds = seconds
+        self.name = name
+        self.started = time.time()
+        self.deadline = self.started + seconds
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def wait(self, driver, condition, timeout=None, poll=0.1, message=""):
+        """
+        Wait until ``condition(driver)`` is truthy and return its value.
+
+        ``timeout`` caps this single wait; it never extends past the budget.
+        Raises BudgetExceeded when the budget, rather than ``timeout``, ran out.
+        """
+        remaining = self.remaining()
+        limit = remaining if timeout is None else min(timeout, remaining)
+        if limit <= 0:
+            raise BudgetExceeded(f"{self.name} exceeded its {self.seconds}s budget {message}".strip())
+        try:
+            return WebDriverWait(driver, limit, poll_frequency=poll).until(condition, message)
+        except TimeoutException:
+            if self.remaining() <= 0:
+                raise BudgetExceeded(f"{self.name} exceeded its {self.seconds}s budget {message}".strip())
+            raise
+
+    def try_wait(self, driver, condition, timeout=None, poll=0.1):
+        """Like ``wait`` but return None instead of raising when ``timeout`` runs out"""
+        try:
+            return self.wait(driver, condition, timeout=timeout, poll=poll)
+        except BudgetExceeded:
+            raise
+        except TimeoutException:
+            return None
+
+
+# Conditions; each takes the driver and returns a truthy value once satisfied
+
+CHALLENGE_TITLES = ("just a moment", "attention required", "checking your browser")
+
+
+def page_ready(driver):
+    """Document loaded and not sitting on a Cloudflare-style interstitial"""
+    state, title = driver.execute_script("return [document.readyState, document.title]")
+    if state != "complete":
+        return False
+    title = (title or "").lower()
+    return not any(marker in title for marker in CHALLENGE_TITLES)
+
+
+def url_changed_from(url):
+    def condition(driver):
+        return driver.current_url != url
+    return condition
+
+
+def any_of(*conditions):
+    """Satisfied as soon as one of ``conditions`` is; returns that condition's value"""
+    def condition(driver):
+        for check in conditions:
+            try:
+                result = check(driver)
+            except WebDriverException:
+                continue
+            if result:
+                return result
+        return False
+    return condition
+
+
+class network_idle:
+    """
+    Satisfied once the document is loaded and no new resource has started
+    loading for ``quiet_period`` seconds (based on the Resource Timing API).
+    """
+
+    def __init__(self, quiet_period=0.5):
+        self.quiet_period = quiet_period
+        self.last_count = None
+        self.last_change = time.time()
+
+    def __call__(self, driver):
+        state, count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length]"
+        )
+        now = time.time()
+        if count != self.last_count:
+            self.last_count = count
+            self.last_change = now
+            return False
+        return state == "complete" and now - self.last_change >= self.quiet_period
@@ -1,28 +1,234 @@
+import time
+
+# Startup phases are measured from here, before the heavy imports
+_import_started = time.time()
+
 import requests
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from kigoauto_automation import KigoAutoLogin
+from kigoauto_automation import BASE_URL, LOGIN_COOKIES, shared_selector_cache
+from kigoauto_pool import DriverPool
+from kigoauto_contexts import SharedChromeGroup, BROWSER_BACKENDS
+from kigoauto_executor import BrowserExecutor
+from kigoauto_sessions import SessionRegistry, SessionLifecycle
+from kigoauto_store import SessionStore
+from kigoauto_http import CartHttpClient, ChallengeDetected
+from kigoauto_cart import CartCache
+from kigoauto_verify import auth_cookie_names
+from kigoauto_browser import resource_stats, resolve_chromedriver, chromedriver_status
+from kigoauto_startup import StartupPhases
+from kigoauto_jobs import JobQueue, QueueFull
+from kigoauto_metrics import metrics
+from kigoauto_supervisor import BrowserSupervisor
+from kigoauto_directory import SessionDirectory, default_worker_id
+from kigoauto_affinity import WorkerRouter, InternalServer, query_param, json_field
+import asyncio
 import json
+import os
 import traceback
-from typing import Optional
-
-# Initialize KigoAutoLogin with error handling
-kigo = None
-try:
-    kigo = KigoAutoLogin(headless=True)
-    print("KigoAutoLogin initialized successfully")
-except Exception as e:
-    print(f"Warning: Failed to initialize KigoAutoLogin on startup: {str(e)}")
-    print("Will attempt to initialize on first request")
-
-# Global variables for session management
-cart_token = ""
-cookies = {}
-session_cookies = []
+from typing import List, Optional
+
+# Time to import, start and warm up this worker; /readyz flips once it can serve logins
+startup = StartupPhases(started_at=_import_started)
+WARMUP_TIMEOUT = float(os.environ.get("KIGOAUTO_WARMUP_TIMEOUT", "300"))
+_shutting_down = False
+
+# "process" gives every session a Chrome of its own, "contexts" hosts sessions as
+# isolated browser contexts inside KIGOAUTO_CONTEXT_BROWSERS shared Chrome processes
+BROWSER_BACKEND = os.environ.get("KIGOAUTO_BROWSER_BACKEND", "process")
+if BROWSER_BACKEND not in BROWSER_BACKENDS:
+    raise ValueError(f"Unknown browser backend '{BROWSER_BACKEND}', expected one of {BROWSER_BACKENDS}")
+shared_chromes = SharedChromeGroup(
+    browsers=int(os.environ.get("KIGOAUTO_CONTEXT_BROWSERS", "1")),
+    headless=True,
+) if BROWSER_BACKEND == "contexts" else None
+
+# Pool of pre-launched browsers; /login takes a warm driver instead of cold-starting Chrome
+driver_pool = DriverPool(
+    size=int(os.environ.get("KIGOAUTO_POOL_SIZE", "1")),
+    idle_ttl=float(os.environ.get("KIGOAUTO_POOL_IDLE_TTL", "600")),
+    max_age=float(os.environ.get("KIGOAUTO_POOL_MAX_AGE", "3600")),
+    headless=True,
+    factory=shared_chromes.session if shared_chromes is not None else None,
+)
+
+# Bounded thread pool for blocking Selenium work, keeps the event loop free
+browser_executor = BrowserExecutor(
+    max_workers=int(os.environ.get("KIGOAUTO_BROWSER_WORKERS", "4"))
+)
+
+# Logged-in sessions, one per account; each owns its driver, cookies and cart token
+def _release_session_driver(session):
+    if session.kigo is not None:
+        driver_pool.release(session.kigo)
+        session.kigo = None
+    # A session the lifecycle only took the browser from is still registered and keeps its cart entry
+    if session.session_id not in sessions:
+        cart_cache.discard(session.session_id)
+
+sessions = SessionRegistry(
+    max_sessions=int(os.environ.get("KIGOAUTO_MAX_SESSIONS", "8")),
+    idle_timeout=float(os.environ.get("KIGOAUTO_SESSION_IDLE_TIMEOUT", "1800")),
+    on_evict=_release_session_driver,
+    lifecycle=SessionLifecycle.from_env(),
+)
+SESSION_SWEEP_INTERVAL = 30
+
+# Upper bound on ProductBatch.concurrency; stays below the HTTP client's 10 pooled connections
+MAX_BATCH_CONCURRENCY = int(os.environ.get("KIGOAUTO_BATCH_MAX_CONCURRENCY", "8"))
+
+# Pings every browser, relaunches crashed or worn-out ones and cleans up leftovers
+browser_supervisor = BrowserSupervisor(
+    sessions,
+    driver_pool,
+    interval=float(os.environ.get("KIGOAUTO_HEALTH_INTERVAL", "30")),
+    ping_timeout=float(os.environ.get("KIGOAUTO_HEALTH_PING_TIMEOUT", "5")),
+    max_rss_mb=float(os.environ.get("KIGOAUTO_DRIVER_MAX_RSS_MB", "1024")),
+    max_pages=int(os.environ.get("KIGOAUTO_DRIVER_MAX_PAGES", "200")),
+    max_age=driver_pool.max_age,
+)
+
+# Login cookies persisted across requests, restarts and workers
+session_store = SessionStore(
+    path=os.environ.get("KIGOAUTO_SESSION_STORE", "kigoauto_sessions.db"),
+    default_ttl=float(os.environ.get("KIGOAUTO_SESSION_STORE_TTL", str(12 * 3600))),
+)
+
+# Parsed carts per session for /cart-status, dropped whenever the session adds to cart
+cart_cache = CartCache(ttl=float(os.environ.get("KIGOAUTO_CART_CACHE_TTL", "5")))
+
+# Queued /jobs/* work: bounded, prioritized, serialized per account
+job_queue = JobQueue(
+    workers=int(os.environ.get("KIGOAUTO_JOB_WORKERS", "2")),
+    max_queued=int(os.environ.get("KIGOAUTO_JOB_QUEUE_SIZE", "100")),
+    retention=float(os.environ.get("KIGOAUTO_JOB_RETENTION", "3600")),
+)
+_event_loop = None
+JOB_EVENT_POLL = 0.1
+
+# Multi-worker mode: workers (e.g. under gunicorn) share a directory of which worker
+# owns each session, account and job, and forward requests to the owner
+MULTI_WORKER = os.environ.get("KIGOAUTO_MULTI_WORKER", "") == "1"
+WORKER_HEARTBEAT_INTERVAL = 10
+worker_id = default_worker_id()
+worker_directory = SessionDirectory(
+    path=os.environ.get("KIGOAUTO_SESSION_DIRECTORY") or session_store.path,
+    stale_after=3 * WORKER_HEARTBEAT_INTERVAL,
+) if MULTI_WORKER else None
+internal_server = None
+
+# Routes whose state lives on one worker, found by session_id, account email or job_id
+SESSION_ROUTES = {"/add-product", "/add-products", "/get-cookies", "/update-cookies", "/cart-status",
+                  "/close-browser", "/jobs/add-product", "/jobs/add-products"}
+ACCOUNT_ROUTES = {"/login", "/jobs/login"}
 
 # FastAPI app
 app = FastAPI(title="KigoAuto Automation API", version="1.0.0")
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record handling time per route into kigoauto_http_request_seconds"""
+    start = time.time()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.observe(
+            "kigoauto_http_request_seconds", time.time() - start,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status
+        )
+
+def _collect_occupancy():
+    """Pool, executor, job queue and session gauges read at scrape time"""
+    pool = driver_pool.stats()
+    for state in ("idle", "in_use", "launching", "retiring"):
+        yield "kigoauto_pool_drivers", "gauge", pool[state], {"state": state}
+    yield "kigoauto_pool_size", "gauge", pool["size"], {}
+    for counter in ("launched", "recycled", "cold_starts"):
+        yield f"kigoauto_pool_{counter}_total", "counter", pool[counter], {}
+    executor = browser_executor.stats()
+    yield "kigoauto_executor_tasks", "gauge", executor["active"], {"state": "active"}
+    yield "kigoauto_executor_tasks", "gauge", executor["queued"], {"state": "queued"}
+    jobs = job_queue.stats()
+    yield "kigoauto_jobs", "gauge", jobs["queued"], {"state": "queued"}
+    yield "kigoauto_jobs", "gauge", jobs["running"], {"state": "running"}
+    yield "kigoauto_sessions", "gauge", len(sessions), {}
+    supervisor = browser_supervisor.stats()
+    for counter in ("recovered", "idle_retired", "zombies_reaped", "orphans_killed", "profile_dirs_removed"):
+        yield f"kigoauto_supervisor_{counter}_total", "counter", supervisor[counter], {}
+
+metrics.register_collector(_collect_occupancy)
+metrics.register_collector(startup.collect)
+
+def _remote_owner(kind, key):
+    owner = worker_directory.owner(kind, key)
+    return owner if owner is not None and owner[0] != worker_id else None
+
+def _locate_owner(scope, body):
+    """(worker_id, address) of the worker that should handle a request, None for this one"""
+    path = scope["path"]
+    if path in ACCOUNT_ROUTES:
+        # Log in again where the account's browser already is
+        email = json_field(body, "email")
+        if not email or sessions.find_by_account(email) is not None:
+            return None
+        return _remote_owner("account", email)
+    if path in SESSION_ROUTES:
+        session_id = query_param(scope, "session_id") or json_field(body, "session_id")
+        if session_id is None:
+            # No handle: only unambiguous when a single session exists, which may live on another worker
+            if len(sessions):
+                return None
+            held = sum(kinds.get("session", 0) for kinds in worker_directory.counts().values())
+            latest = worker_directory.latest("session") if held == 1 else None
+            return latest[1:] if latest is not None and latest[1] != worker_id else None
+        if session_id in sessions:
+            return None
+        return _remote_owner("session", session_id)
+    parts = path.strip("/").split("/")
+    if len(parts) >= 2 and parts[0] == "jobs":
+        if job_queue.get(parts[1]) is not None:
+            return None
+        return _remote_owner("job", parts[1])
+    return None
+
+def _claim_session(session):
+    """Tell the other workers this worker now owns the session and its account"""
+    if worker_directory is not None:
+        worker_directory.claim("session", session.session_id, worker_id)
+        worker_directory.claim("account", session.account, worker_id)
+
+async def _worker_heartbeat():
+    """Keep this worker registered and its directory entries in line with what it holds"""
+    while True:
+        try:
+            await browser_executor.run(_sync_directory)
+        except Exception as e:
+            print(f"Warning: Worker directory heartbeat failed: {e}")
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+def _sync_directory():
+    held = sessions.snapshot()
+    worker_directory.heartbeat(worker_id, internal_server.address)
+    worker_directory.sync(worker_id, "session", [session.session_id for session in held])
+    worker_directory.sync(worker_id, "account", [session.account for session in held])
+    worker_directory.sync(worker_id, "job", [job["job_id"] for job in job_queue.list()])
+
+if MULTI_WORKER:
+    # Every worker also serves the app on its own port, for requests forwarded by its peers
+    internal_server = InternalServer(
+        app,
+        host=os.environ.get("KIGOAUTO_WORKER_HOST", "127.0.0.1"),
+        port=int(os.environ.get("KIGOAUTO_WORKER_PORT", "0")),
+        advertise_host=os.environ.get("KIGOAUTO_WORKER_ADVERTISE_HOST") or None,
+    )
+    app.add_middleware(WorkerRouter, locate=_locate_owner, worker_id=worker_id)
+
 class Account(BaseModel):
     email: str
     password: str
@@ -30,19 +236,47 @@ class Account(BaseModel):
 class Product(BaseModel):
     url: str
     quantity: int = 1
+    session_id: Optional[str] = None
 
 class LoginResponse(BaseModel):
     status: str
     message: Optional[str] = None
+    session_id: Optional[str] = None
+    cached: bool = False
     cookies: Optional[dict] = None
     cart_token: Optional[str] = None
 
 class ProductResponse(BaseModel):
     status: str
     message: str
+    session_id: Optional[str] = None
     cart_token: Optional[str] = None
+    cart_count: Optional[int] = None
     cookies: Optional[dict] = None
 
+class ProductBatch(BaseModel):
+    items: List[Product]
+    session_id: Optional[str] = None
+    concurrency: int = 4
+
+class ProductBatchResponse(BaseModel):
+    status: str
+    message: str
+    session_id: Optional[str] = None
+    results: List[dict] = []
+    seconds: Optional[float] = None
+    cart_token: Optional[str] = None
+    cookies: Optional[dict] = None
+
+NOT_LOGGED_IN = "Not logged in. Please login first."
+SESSION_ID_REQUIRED = "session_id required: several sessions are open."
+
+def _no_session(session_id, message=NOT_LOGGED_IN):
+    """Why no session was found: the handle was left out with several sessions open, or not logged in"""
+    if session_id is None and len(sessions) > 1:
+        return SESSION_ID_REQUIRED
+    return message
+
 @app.get("/")
 async def root():
     """Root endpoint to check if API is running"""
@@ -51,66 +285,99 @@ async def root():
         "endpoints": {
             "/login": "POST - Login to KigoAuto",
             "/add-product": "POST - Add product to cart",
+            "/add-products": "POST - Add several products to cart in one session",
             "/get-cookies": "GET - Get current session cookies",
             "/update-cookies": "POST - Update session cookies",
             "/cart-status": "GET - Get cart status",
-            "/close-browser": "POST - Close browser and cleanup"
+            "/close-browser": "POST - Close browser and cleanup",
+            "/sessions": "GET - List active sessions",
+            "/selectors/report": "GET - Selector cache hit/miss report",
+            "/resource-stats": "GET - Bytes transferred and saved by resource blocking",
+            "/pool-status": "GET - Get driver pool occupancy",
+            "/healthz": "GET - Liveness probe",
+            "/readyz": "GET - Readiness probe (503 until ChromeDriver is resolved and the pool is warm)",
+            "/metrics": "GET - Prometheus metrics (latency summaries, counters, occupancy)",
+            "/jobs/login": "POST - Queue a login, returns a job_id",
+            "/jobs/add-product": "POST - Queue an add-to-cart, returns a job_id",
+            "/jobs/add-products": "POST - Queue a batch add-to-cart, returns a job_id",
+            "/jobs/{job_id}": "GET - Job status and result, DELETE - Cancel a job",
+            "/jobs/{job_id}/events": "GET - Stream a job's steps as server-sent events",
+            "/jobs": "GET - List queued, running and recent jobs"
         }
     }
 
 @app.post("/login", response_model=LoginResponse)
 async def login(account: Account):
     """Login to KigoAuto.com and retrieve session cookies"""
-    global cart_token, cookies, session_cookies, kigo
+    # Skip the UI login when cached cookies for this account still work
+    cached_client = await browser_executor.run(_probe_cached_session, account.email, account.password)
     
-    # Initialize KigoAutoLogin if not already done
-    if kigo is None:
-        try:
-            kigo = KigoAutoLogin(headless=True)
-            print("KigoAutoLogin initialized on demand")
-        except Exception as e:
-            error_msg = f"Failed to initialize WebDriver: {str(e)}"
-            print(error_msg)
-            traceback.print_exc()
-            return LoginResponse(
-                status="fail",
-                message=error_msg
-            )
+    # Take a warm driver from the pool for this login
+    try:
+        kigo = await browser_executor.run(driver_pool.acquire)
+    except Exception as e:
+        if cached_client is not None:
+            cached_client.close()
+        error_msg = f"Failed to initialize WebDriver: {str(e)}"
+        print(error_msg)
+        traceback.print_exc()
+        return LoginResponse(
+            status="fail",
+            message=error_msg
+        )
     
+    session = None
     try:
+        if cached_client is not None:
+            print(f"Reusing cached session for: {account.email}")
+            cached_cookies = cached_client.get_cookies()
+            kigo.restore_session(cached_cookies, http=cached_client)
+            session = sessions.create(account.email, kigo)
+            session.update_cookies(cached_cookies)
+            _claim_session(session)
+            return LoginResponse(
+                status="success",
+                message="Login successful (cached session)",
+                session_id=session.session_id,
+                cached=True,
+                cookies=session.cookies,
+                cart_token=session.cart_token
+            )
+        
         print(f"Attempting login for: {account.email}")
         
         # Perform login
-        if kigo.login(account.email, account.password):
-            # Get cookies from the browser
-            session_cookies = kigo.get_cookies()
+        if await browser_executor.with_driver(kigo, kigo.login, account.email, account.password):
+            # Register the session; this replaces any older session of the same account
+            session = sessions.create(account.email, kigo)
+            _claim_session(session)
             
-            # Process cookies into a dictionary
-            cookies = {}
-            for cookie in session_cookies:
-                cookies[cookie["name"]] = cookie["value"]
-                # Look for cart-related cookies
-                if "cart" in cookie["name"].lower():
-                    cart_token = cookie["value"]
+            # Get cookies from the browser
+            session.update_cookies(await browser_executor.with_driver(kigo, kigo.get_cookies))
             
-            # Save cookies to file for backup
-            kigo.save_cookies_to_file("kigoauto_session.json")
+            # Persist cookies so the next login for this account can skip the UI
+            await browser_executor.run(session_store.save, account.email, session.session_cookies,
+                                       account.password)
             
-            print(f"Login successful. Retrieved {len(cookies)} cookies")
+            print(f"Login successful. Retrieved {len(session.cookies)} cookies")
             
             return LoginResponse(
                 status="success",
                 message="Login successful",
-                cookies=cookies,
-                cart_token=cart_token
+                session_id=session.session_id,
+                cookies=session.cookies,
+                cart_token=session.cart_token
             )
         else:
+            driver_pool.release(kigo)
             return LoginResponse(
                 status="fail",
                 message="Login failed. Please check credentials."
             )
             
     except Exception as e:
+        if session is None:
+            driver_pool.release(kigo)
         error_msg = f"Login error: {str(e)}"
         print(error_msg)
         traceback.print_exc()
@@ -119,49 +386,60 @@ async def login(account: Account):
             message=error_msg
         )
 
+async def _session_driver(session):
+    """
+    The session's browser. One handed back by the session lifecycle is replaced
+    by a pool driver carrying the session's cookies, so the cart stays the same.
+    """
+    if session.kigo is not None:
+        return session.kigo
+    kigo = await browser_executor.run(driver_pool.acquire)
+    if session.kigo is not None or session.session_id not in sessions:
+        # Another request got the session a browser first, or the session was closed meanwhile
+        driver_pool.release(kigo)
+        if session.kigo is None:
+            raise RuntimeError(NOT_LOGGED_IN)
+        return session.kigo
+    kigo.restore_session(session.session_cookies)
+    session.kigo = kigo
+    return kigo
+
 @app.post("/add-product", response_model=ProductResponse)
 async def add_product(product: Product):
     """Add a product to the cart"""
-    global kigo, cart_token, cookies
+    session = sessions.get(product.session_id)
     
-    # Check if KigoAutoLogin is initialized
-    if kigo is None:
+    # Check if the session has a browser, or the cookies to get one back
+    if session is None or (session.kigo is None and not session.session_cookies):
         return ProductResponse(
             status="fail",
-            message="Not logged in. Please login first."
+            message=_no_session(product.session_id),
+            session_id=product.session_id
         )
     
     try:
+        kigo = await _session_driver(session)
         print(f"Adding product: {product.url} with quantity: {product.quantity}")
         
         # Add product to cart
-        if kigo.add_products(product.url, product.quantity):
+        if await browser_executor.with_driver(kigo, kigo.add_products, product.url, product.quantity):
             # Get updated cookies
-            updated_cookies = kigo.get_cookies()
-            
-            # Update global cookies
-            cookies = {}
-            for cookie in updated_cookies:
-                cookies[cookie["name"]] = cookie["value"]
-                if "cart" in cookie["name"].lower():
-                    cart_token = cookie["value"]
-            
-            # Optional: Auto-close browser after adding to cart
-            # Uncomment the following lines if you want to auto-close
-            print("Auto-closing browser after adding to cart...")
-            kigo.close()
-            kigo = None
+            session.update_cookies(await browser_executor.with_driver(kigo, kigo.get_cookies))
+            await browser_executor.run(session_store.save, session.account, session.session_cookies)
             
             return ProductResponse(
                 status="success",
                 message=f"Successfully added {product.quantity} item(s) to cart",
-                cart_token=cart_token,
-                cookies=cookies
+                session_id=session.session_id,
+                cart_token=session.cart_token,
+                cart_count=(kigo.last_cart_response or {}).get("cart_count"),
+                cookies=session.cookies
             )
         else:
             return ProductResponse(
                 status="fail",
-                message="Failed to add product to cart"
+                message="Failed to add product to cart",
+                session_id=session.session_id
             )
             
     except Exception as e:
@@ -170,54 +448,113 @@ async def add_product(product: Product):
         traceback.print_exc()
         return ProductResponse(
             status="error",
-            message=error_msg
+            message=error_msg,
+            session_id=session.session_id
+        )
+    finally:
+        # The cart changed (or may have); the next /cart-status reads it again
+        cart_cache.invalidate(session.session_id)
+        # Keep or hand back the browser according to the session lifecycle
+        sessions.end_operation(session)
+
+@app.post("/add-products", response_model=ProductBatchResponse)
+async def add_products(batch: ProductBatch):
+    """Add several products to the cart in one logged-in session"""
+    session = sessions.get(batch.session_id)
+    
+    if session is None or (session.kigo is None and not session.session_cookies):
+        return ProductBatchResponse(
+            status="fail",
+            message=_no_session(batch.session_id),
+            session_id=batch.session_id
+        )
+    items = [(item.url, item.quantity) for item in batch.items]
+    
+    try:
+        kigo = await _session_driver(session)
+        print(f"Adding {len(items)} products in one batch")
+        start = time.time()
+        results = await browser_executor.with_driver(
+            kigo, kigo.add_products_batch, items, min(max(1, batch.concurrency), MAX_BATCH_CONCURRENCY)
+        )
+        seconds = round(time.time() - start, 3)
+        
+        session.update_cookies(await browser_executor.with_driver(kigo, kigo.get_cookies))
+        await browser_executor.run(session_store.save, session.account, session.session_cookies)
+        
+        added = sum(1 for result in results if result["status"] == "success")
+        if added == len(results):
+            status = "success"
+        elif added:
+            status = "partial"
+        else:
+            status = "fail"
+        
+        return ProductBatchResponse(
+            status=status,
+            message=f"Added {added} of {len(results)} products to cart",
+            session_id=session.session_id,
+            results=results,
+            seconds=seconds,
+            cart_token=session.cart_token,
+            cookies=session.cookies
+        )
+        
+    except Exception as e:
+        error_msg = f"Error adding products: {str(e)}"
+        print(error_msg)
+        traceback.print_exc()
+        return ProductBatchResponse(
+            status="error",
+            message=error_msg,
+            session_id=session.session_id
         )
+    finally:
+        cart_cache.invalidate(session.session_id)
+        sessions.end_operation(session)
 
 @app.get("/get-cookies")
-async def get_cookies():
+async def get_cookies(session_id: Optional[str] = None):
     """Get current session cookies"""
-    global cookies, cart_token
+    session = sessions.get(session_id)
     
-    if not cookies:
+    if session is None or not session.cookies:
         return {
             "status": "fail",
-            "message": "No active session. Please login first."
+            "message": _no_session(session_id, "No active session. Please login first.")
         }
     
     return {
         "status": "success",
-        "cookies": cookies,
-        "cart_token": cart_token,
-        "total_cookies": len(cookies)
+        "session_id": session.session_id,
+        "cookies": session.cookies,
+        "cart_token": session.cart_token,
+        "total_cookies": len(session.cookies)
     }
 
 @app.post("/update-cookies")
-async def update_cookies():
+async def update_cookies(session_id: Optional[str] = None):
     """Update cookies from current browser session"""
-    global kigo, cookies, cart_token
+    session = sessions.get(session_id)
     
-    if kigo is None:
+    if session is None or session.kigo is None:
         return {
             "status": "fail",
-            "message": "Not logged in. Please login first."
+            "message": _no_session(session_id)
         }
     
     try:
         # Get current cookies from browser
-        current_cookies = kigo.get_cookies()
-        
-        # Update global cookies
-        cookies = {}
-        for cookie in current_cookies:
-            cookies[cookie["name"]] = cookie["value"]
-            if "cart" in cookie["name"].lower():
-                cart_token = cookie["value"]
+        kigo = session.kigo
+        session.update_cookies(await browser_executor.with_driver(kigo, kigo.get_cookies))
+        cart_cache.invalidate(session.session_id)
         
         return {
             "status": "success",
             "message": "Cookies updated successfully",
-            "cookies": cookies,
-            "cart_token": cart_token
+            "session_id": session.session_id,
+            "cookies": session.cookies,
+            "cart_token": session.cart_token
         }
         
     except Exception as e:
@@ -227,80 +564,98 @@ async def update_cookies():
         }
 
 @app.get("/cart-status")
-async def cart_status():
-    """Get current cart status"""
-    global kigo, cart_token
+async def cart_status(session_id: Optional[str] = None, refresh: bool = False):
+    """Get the cart's line items and totals, read over HTTP and cached briefly"""
+    session = sessions.get(session_id)
     
-    if kigo is None:
+    if session is None or (session.kigo is None and not session.session_cookies):
         return {
             "status": "fail",
-            "message": "Not logged in. Please login first."
+            "message": _no_session(session_id)
         }
     
     try:
-        # Navigate to cart page
-        kigo.driver.get("http://kigoauto.com/cart")
-        kigo.human_like_delay(2, 3)
-        
-        # Try to find cart items or total
-        cart_info = {
-            "status": "success",
-            "cart_url": kigo.driver.current_url,
-            "cart_token": cart_token
-        }
-        
-        # Look for cart item count
-        try:
-            cart_count_selectors = [
-                ".cart-count",
-                ".cart-item-count",
-                ".cart-qty",
-                "[data-cart-count]"
-            ]
-            
-            from selenium.webdriver.common.by import By
-            for selector in cart_count_selectors:
-                try:
-                    element = kigo.driver.find_element(By.CSS_SELECTOR, selector)
-                    if element:
-                        cart_info["item_count"] = element.text
-                        break
-                except:
-                    continue
-        except:
-            pass
+        cached = None if refresh else cart_cache.get(session.session_id)
+        if cached is not None:
+            cart, age = cached
+            metrics.inc("kigoauto_cart_reads_total", source="cache")
+            return dict(cart, cached=True, age=round(age, 3))
         
-        return cart_info
+        generation = cart_cache.begin(session.session_id)
+        kigo = session.kigo
+        if kigo is not None:
+            cart = await browser_executor.run(kigo.read_cart)
+        else:
+            # The browser was handed back (see KIGOAUTO_SESSION_LIFECYCLE); the cookies still read the cart
+            cart = await browser_executor.run(_read_cart_with_cookies, session.session_cookies)
+        metrics.inc("kigoauto_cart_reads_total", source=cart["source"])
+        cart.update(status="success", session_id=session.session_id, cart_token=session.cart_token)
+        cart_cache.put(session.session_id, cart, generation)
+        return dict(cart, cached=False, age=0.0)
         
+    except ChallengeDetected as e:
+        return {
+            "status": "fail",
+            "message": f"Cart page not readable over HTTP: {str(e)}",
+            "session_id": session.session_id
+        }
     except Exception as e:
         return {
             "status": "error",
             "message": f"Failed to get cart status: {str(e)}"
         }
 
+def _probe_cached_session(account, password):
+    """
+    Return an HTTP client for the account's cached cookies if they were saved for
+    this password and are still logged in (blocking)
+    """
+    cookies = session_store.load(account, password)
+    if not cookies:
+        return None
+    client = CartHttpClient(cookies)
+    if client.is_logged_in(f"{BASE_URL}/account", auth_cookie_names(LOGIN_COOKIES)):
+        return client
+    client.close()
+    session_store.invalidate(account)
+    return None
+
+def _read_cart_with_cookies(cookies):
+    """Read the cart over HTTP for a session without a browser (blocking)"""
+    client = CartHttpClient(cookies)
+    try:
+        return dict(client.get_cart(f"{BASE_URL}/cart"), source="http")
+    finally:
+        client.close()
+
 @app.post("/close-browser")
-async def close_browser():
+async def close_browser(session_id: Optional[str] = None):
     """Close the browser and cleanup resources"""
-    global kigo, cart_token, cookies
+    session = sessions.get(session_id)
     
-    if kigo is None:
+    if session is None:
+        if session_id is None and len(sessions) > 1:
+            return {
+                "status": "fail",
+                "message": SESSION_ID_REQUIRED
+            }
         return {
             "status": "info",
             "message": "No browser session to close"
         }
     
     try:
-        # Close the browser
-        kigo.close()
-        
-        # Reset the global variables
-        kigo = None
-        cart_token = ""
-        cookies = {}
+        # Drop the session and close its browser; the pool replaces it with a warm one
+        sessions.remove(session.session_id)
+        _release_session_driver(session)
+        if worker_directory is not None:
+            worker_directory.release("session", session.session_id, worker_id)
+            worker_directory.release("account", session.account, worker_id)
         
         return {
             "status": "success",
-            "message": "Browser closed successfully"
+            "message": "Browser closed successfully",
+            "session_id": session.session_id
         }
         
     except Exception as e:
@@ -309,16 +664,264 @@ async def close_browser():
             "message": f"Failed to close browser: {str(e)}"
         }
 
+@app.get("/sessions")
+async def list_sessions():
+    """List active sessions"""
+    return {
+        "status": "success",
+        "sessions": sessions.list()
+    }
+
+@app.get("/selectors/report")
+async def selectors_report():
+    """Report which selector candidates match and which are stale"""
+    return {
+        "status": "success",
+        "selectors": shared_selector_cache().report()
+    }
+
+@app.get("/resource-stats")
+async def resource_stats_report():
+    """Bytes transferred per page kind and bytes saved by resource blocking"""
+    return {
+        "status": "success",
+        "pages": resource_stats.report()
+    }
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker is up and its event loop answers"""
+    return {
+        "status": "ok",
+        "worker_id": worker_id,
+        "uptime": round(time.time() - startup.started_at, 3)
+    }
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """Readiness: ChromeDriver is resolved and the pool has a warm driver; 503 until then"""
+    ready, checks = _readiness()
+    if ready:
+        startup.ready()
+    else:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "starting",
+        "checks": checks,
+        "startup": startup.to_dict()
+    }
+
+def _readiness():
+    pool = driver_pool.stats()
+    chromedriver = chromedriver_status()
+    # Without a resolved binary, Selenium may still find one; a launched driver proves it
+    driver_ok = bool(chromedriver["path"]) or pool["launched"] > 0
+    pool_ok = pool["size"] == 0 or pool["launched"] > 0
+    checks = {
+        "chromedriver": dict(chromedriver, ok=driver_ok),
+        "pool": {"ok": pool_ok, "size": pool["size"], "launched": pool["launched"],
+                 "idle": pool["idle"], "last_error": pool["last_error"]},
+        "shutting_down": {"ok": not _shutting_down},
+    }
+    return all(check["ok"] for check in checks.values()), checks
+
+async def _warmup():
+    """Resolve ChromeDriver and wait for the first warm driver, off the startup path"""
+    try:
+        with startup.phase("chromedriver"):
+            await asyncio.to_thread(resolve_chromedriver)
+    except Exception as e:
+        print(f"Warning: ChromeDriver resolution failed during warmup: {e}")
+    if driver_pool.size:
+        try:
+            with startup.phase("pool_warm"):
+                if not await asyncio.to_thread(driver_pool.wait_warm, 1, WARMUP_TIMEOUT):
+                    raise TimeoutError(f"no warm driver after {WARMUP_TIMEOUT}s: {driver_pool.last_error}")
+        except Exception as e:
+            print(f"Warning: Driver pool warmup failed: {e}")
+    ready, checks = _readiness()
+    if ready:
+        print(f"Worker ready after {startup.ready()}s")
+    else:
+        print(f"Warmup finished but the worker is not ready: {checks}")
+
+@app.get("/pool-status")
+async def pool_status():
+    """Get driver pool occupancy"""
+    return {
+        "status": "success",
+        "pool": driver_pool.stats(),
+        "executor": browser_executor.stats(),
+        "jobs": job_queue.stats(),
+        "supervisor": browser_supervisor.stats(),
+        "sessions": len(sessions),
+        "browser_backend": BROWSER_BACKEND,
+        "shared_chromes": shared_chromes.stats() if shared_chromes is not None else None,
+        "worker": _worker_status()
+    }
+
+def _worker_status():
+    if worker_directory is None:
+        return {"worker_id": worker_id, "multi_worker": False}
+    return {
+        "worker_id": worker_id,
+        "multi_worker": True,
+        "address": internal_server.address,
+        "workers": worker_directory.workers(),
+        "owned": worker_directory.counts()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Timings, counters and pool occupancy in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _run_handler(handler, *args):
+    """Run an endpoint coroutine on the app's event loop from a job worker and return its JSON result"""
+    future = asyncio.run_coroutine_threadsafe(handler(*args), _event_loop)
+    return jsonable_encoder(future.result())
+
+def _submit_job(kind, handler, payload, account, priority):
+    try:
+        job = job_queue.submit(kind, _run_handler, handler, payload, account=account, priority=priority)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    if worker_directory is not None:
+        worker_directory.claim("job", job.job_id, worker_id)
+    return job.to_dict()
+
+def _session_account(session_id):
+    """Account owning the session a queued cart job will use; jobs are serialized per account"""
+    session = sessions.get(session_id)
+    if session is None:
+        # The job could only fail, and without an account it would skip the per-account queue
+        raise HTTPException(status_code=404, detail=_no_session(session_id))
+    return session.account
+
+@app.post("/jobs/login", status_code=202)
+async def submit_login_job(account: Account, priority: int = 0):
+    """Queue a login; poll /jobs/{job_id} for the LoginResponse"""
+    return _submit_job("login", login, account, account.email, priority)
+
+@app.post("/jobs/add-product", status_code=202)
+async def submit_add_product_job(product: Product, priority: int = 0):
+    """Queue an add-to-cart; poll /jobs/{job_id} for the ProductResponse"""
+    return _submit_job("add-product", add_product, product, _session_account(product.session_id), priority)
+
+@app.post("/jobs/add-products", status_code=202)
+async def submit_add_products_job(batch: ProductBatch, priority: int = 0):
+    """Queue a batch add-to-cart; poll /jobs/{job_id} for the ProductBatchResponse"""
+    return _submit_job("add-products", add_products, batch, _session_account(batch.session_id), priority)
+
+@app.get("/jobs")
+async def list_jobs():
+    """List queued, running and recently finished jobs"""
+    return {
+        "status": "success",
+        "queue": job_queue.stats(),
+        "jobs": job_queue.list()
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get a job's status, and its result once finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream a job's status changes and step events (SSE), ending with its result"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return StreamingResponse(
+        _job_event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def _job_event_stream(job):
+    sent = 0
+    status = None
+    while True:
+        # Read the finished flag first so no event recorded before it is missed
+        finished = job.finished
+        if job.status != status:
+            status = job.status
+            yield _sse("status", {"job_id": job.job_id, "status": status})
+        for event in job.observer.since(sent):
+            sent += 1
+            yield _sse("step", event)
+        if finished:
+            break
+        await asyncio.sleep(JOB_EVENT_POLL)
+    yield _sse("result", job.to_dict())
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job; a running job stops at its next login/add-to-cart step"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+async def _expire_idle_sessions():
+    """Periodically evict sessions idle past their timeout and drop expired cached logins"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        sessions.expire_idle()
+        try:
+            purged = await browser_executor.run(session_store.purge_expired)
+            if purged:
+                print(f"Dropped {purged} expired cached login(s)")
+        except Exception as e:
+            print(f"Warning: Could not purge expired cached logins: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    """Start warming the driver pool in the background"""
+    global _event_loop
+    # Nothing here waits for Chrome: the pool launches drivers on its own thread and
+    # _warmup tracks readiness, so the worker accepts connections right away
+    with startup.phase("startup_hooks"):
+        _event_loop = asyncio.get_running_loop()
+        driver_pool.start()
+        job_queue.start()
+        browser_supervisor.start()
+        asyncio.get_running_loop().create_task(_expire_idle_sessions())
+        if MULTI_WORKER:
+            internal_server.start()
+            print(f"Worker {worker_id} accepts forwarded requests at {internal_server.address}")
+            asyncio.get_running_loop().create_task(_worker_heartbeat())
+        asyncio.get_running_loop().create_task(_warmup())
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown"""
-    global kigo
-    if kigo:
-        try:
-            kigo.close()
-            print("Browser closed and cleanup completed")
-        except:
-            pass
+    global _shutting_down
+    _shutting_down = True
+    try:
+        job_queue.stop()
+        browser_supervisor.stop()
+        if MULTI_WORKER:
+            worker_directory.unregister_worker(worker_id)
+            internal_server.stop()
+        sessions.clear()
+        driver_pool.close()
+        if shared_chromes is not None:
+            shared_chromes.close()
+        shared_selector_cache().flush()
+        browser_executor.shutdown(wait=False)
+        print("Browser closed and cleanup completed")
+    except:
+        pass
+
+startup.record("import", _import_started)
 
 # Run the application
 if __name__ == "__main__":